@@ -0,0 +1,125 @@
+"""
+等价性检查：python -m benchmarks.check_equivalence [--excel data/game_data.xlsx] [--maps 5] [--samples 30]
+在附带的工作簿与随机合成地图（边长 4–12，行程上限真正起作用）上检查：
+- CompiledEnvironment.step_batch 与逐条 Environment.step 的可行性、下一状态与拒绝原因一致；
+- ScenarioTreeSolver 的蒙特卡洛结果与 forecast=False 的逐样本束搜索逐样本一致；
+- BranchAndBoundSolver 的 cash/用时不劣于 DPSolver。
+有不一致时打印明细并以非零状态退出。
+"""
+import argparse
+import sys
+from typing import Dict, List, Tuple
+import numpy as np
+
+from src.configs import ProblemConfig
+from src.compiled_env import ActionBatch, CompiledEnvironment, StateBatch
+from src.excel_loader import load_problem_config
+from src.models import Environment, State
+from src.monte_carlo import run_monte_carlo
+from src.solvers import BeamSearchSolver, BranchAndBoundSolver, CASH_EPS, DPSolver
+from benchmarks.run_benchmarks import check_bnb_vs_dp
+from benchmarks.synthetic_maps import make_synthetic_config
+
+# 下一状态各数值字段的比较容差
+VALUE_TOL = 1e-6
+
+
+def _random_rows(cfg: ProblemConfig, cenv: CompiledEnvironment, n_states: int,
+                 rng: np.random.Generator) -> Tuple[StateBatch, ActionBatch]:
+    """随机状态（含已过期的天数与空背包）配上束搜索动作、随机购买量与随机（多半不存在的）边。"""
+    n = len(cenv.index)
+    states = StateBatch(
+        day=rng.integers(1, cfg.days + 2, n_states).astype(np.int32),
+        pos=rng.integers(0, n, n_states).astype(np.int32),
+        food=rng.uniform(0, 300, n_states), water=rng.uniform(0, 300, n_states),
+        cash=rng.uniform(0, 10000, n_states),
+    )
+    parent, actions = BeamSearchSolver(cfg).actions_for(states)
+    # 同一批动作再配上随机买入量（可能超重或超出现金）与随机目标节点
+    k = len(parent)
+    buy = ActionBatch(actions.next_node.copy(), rng.uniform(0, 400, k), rng.uniform(0, 400, k),
+                      np.zeros(k), np.zeros(k))
+    jump = ActionBatch(rng.integers(-1, n, k).astype(np.int32), np.zeros(k), np.zeros(k), np.zeros(k), np.zeros(k))
+    rows = np.concatenate([parent, parent, parent])
+    return states.take(rows), ActionBatch.concat([actions, buy, jump])
+
+
+def check_step_batch(cfg: ProblemConfig, n_states: int = 200, seed: int = 0) -> Dict:
+    """逐行比较 step_batch 与 Environment.step，并比较两者按原因累计的拒绝数。"""
+    cenv = CompiledEnvironment(cfg)
+    rng = np.random.default_rng(seed)
+    states, actions = _random_rows(cfg, cenv, n_states, rng)
+    batch_reasons: Dict[str, int] = {}
+    nxt, ok = cenv.step_batch(states, actions, rejections=batch_reasons)
+
+    step_reasons: Dict[str, int] = {}
+    env = Environment(cfg)
+    env.rejections = step_reasons
+    node_ids = list(cenv.index)
+    mismatched: List[int] = []
+    for i, action in enumerate(actions.to_actions(node_ids)):
+        state = State(day=int(states.day[i]), position=node_ids[states.pos[i]], food=float(states.food[i]),
+                      water=float(states.water[i]), cash=float(states.cash[i]))
+        ref = env.step(state, action)
+        if (ref is not None) != bool(ok[i]):
+            mismatched.append(i)
+        elif ref is not None and (
+                cenv.index[ref.position] != nxt.pos[i] or ref.day != nxt.day[i]
+                or not np.allclose([ref.food, ref.water, ref.cash], [nxt.food[i], nxt.water[i], nxt.cash[i]],
+                                   atol=VALUE_TOL)):
+            mismatched.append(i)
+    reasons_match = {k: v for k, v in batch_reasons.items() if v} == {k: v for k, v in step_reasons.items() if v}
+    return {"rows": len(ok), "feasible": int(ok.sum()), "mismatches": len(mismatched),
+            "mismatched_rows": mismatched[:10], "reasons_match": reasons_match}
+
+
+def check_scenario_tree(cfg: ProblemConfig, samples: int = 30, seed: int = 0, beam_width: int = 40) -> Dict:
+    """场景树与 forecast=False 的逐样本束搜索应得到逐样本相同的 success/cash/days_used。"""
+    tree = run_monte_carlo(cfg, samples=samples, seed=seed, beam_width=beam_width, scenario_tree=True)
+    plain = run_monte_carlo(cfg, samples=samples, seed=seed, beam_width=beam_width, forecast=False)
+    mismatched = [a["sample"] for a, b in zip(tree.records, plain.records)
+                  if a["success"] != b["success"] or a["days_used"] != b["days_used"]
+                  or (a["success"] and abs(a["cash"] - b["cash"]) > VALUE_TOL)]
+    return {"samples": samples, "mismatches": len(mismatched), "mismatched_samples": mismatched,
+            "cash_mean": tree.stats.cash_mean}
+
+
+def check_bnb_vs_dp_level(cfg: ProblemConfig) -> Dict:
+    """单个已知天气配置上比较分支定界与精确 DP。"""
+    s0 = Environment(cfg).initial_state()
+    dp = DPSolver(cfg).solve_once(s0)
+    bnb = BranchAndBoundSolver(cfg).solve_once(s0)
+    worse = dp is not None and (bnb is None or bnb.cash < dp.cash - CASH_EPS
+                                or (bnb.cash <= dp.cash + CASH_EPS and bnb.day > dp.day))
+    return {"dp_cash": dp.cash if dp else None, "bnb_cash": bnb.cash if bnb else None, "mismatches": int(worse)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--excel", type=str, default="data/game_data.xlsx", help="Bundled workbook to check")
+    parser.add_argument("--maps", type=int, default=5, help="Random synthetic maps for the bnb/DP check")
+    parser.add_argument("--samples", type=int, default=30, help="Monte Carlo samples for the scenario-tree check")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for random states, weather and maps")
+    args = parser.parse_args()
+
+    workbook, _ = load_problem_config(args.excel, use_cache=False)
+    synthetic = make_synthetic_config(n_nodes=60, days=20, n_mines=1, n_villages=2, end_fraction=0.4,
+                                      seed=args.seed, edge_length=(4, 12))
+    checks = {
+        "step_batch/workbook": check_step_batch(workbook, seed=args.seed),
+        "step_batch/synthetic": check_step_batch(synthetic, seed=args.seed),
+        "scenario_tree/workbook": check_scenario_tree(workbook, samples=args.samples, seed=args.seed),
+        "scenario_tree/synthetic": check_scenario_tree(synthetic, samples=args.samples, seed=args.seed),
+        "bnb_vs_dp/workbook": check_bnb_vs_dp_level(workbook),
+        "bnb_vs_dp/synthetic": check_bnb_vs_dp(args.maps),
+    }
+    failed = False
+    for name, result in checks.items():
+        ok = result["mismatches"] == 0 and result.get("reasons_match", True)
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {result}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+性能基准：python -m benchmarks.run_benchmarks [--quick] [--out bench.json] [--baseline old.json]
+结果写为 JSON，便于在不同提交之间比较。
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from dataclasses import replace
+from typing import Callable, Dict, List
+import numpy as np
+
+from src.excel_loader import build_problem_config_from_excel, load_problem_config
+from src.models import Environment, Action
+from src.solvers import BeamSearchSolver, BranchAndBoundSolver, DPSolver
+from src.monte_carlo import run_monte_carlo
+from src.scenario_tree import ScenarioTreeSolver
+from src.compiled_env import CompiledEnvironment
+from src.policy_eval import PlanPolicy, PlanSet, evaluate_policy
+from src.multi_env import MultiPlayerEnvironment, delayed_departure_plans, payoff_tensor
+from src.weather_sim import WeatherMonteCarlo
+from benchmarks.synthetic_maps import make_synthetic_config, write_workbook
+
+
+def timeit(fn: Callable, repeat: int = 3) -> Dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {"min_s": min(times), "mean_s": sum(times) / len(times)}
+
+
+def bench_env_step(cfg, n_steps: int) -> Dict:
+    env = Environment(cfg)
+    s0 = replace(env.initial_state(), food=200.0, water=200.0)
+    moves = [Action(next_node_id=nid) for nid, _ in env.map_graph.adjacency[s0.position]]
+    actions = [Action(rest=True), Action(rest=True, buy_food=2, buy_water=2)] + moves
+
+    def run():
+        for i in range(n_steps):
+            env.step(s0, actions[i % len(actions)])
+
+    t = timeit(run)
+    return {**t, "ops": n_steps, "us_per_op": t["min_s"] / n_steps * 1e6}
+
+
+def bench_neighbors(cfg, n_calls: int) -> Dict:
+    solver = BeamSearchSolver(cfg, beam_width=40)
+    rng = np.random.default_rng(0)
+    node_ids = solver.tables.node_ids
+    s0 = solver.env.initial_state()
+    states = [replace(s0, position=node_ids[i]) for i in rng.integers(0, len(node_ids), size=256)]
+
+    def run():
+        for i in range(n_calls):
+            solver.neighbors(states[i % len(states)])
+
+    t = timeit(run)
+    return {**t, "ops": n_calls, "us_per_op": t["min_s"] / n_calls * 1e6}
+
+
+def bench_solve_once(cfg, beam_width: int) -> Dict:
+    def run():
+        solver = BeamSearchSolver(cfg, beam_width=beam_width)
+        run.res = solver.solve_once(solver.env.initial_state())
+        run.layers = len(solver.layer_stats)
+
+    t = timeit(run)
+    return {**t, "beam_width": beam_width, "layers": run.layers,
+            "success": run.res is not None, "cash": run.res.cash if run.res else None}
+
+
+def bench_solver_memory(cfg, samples: int) -> Dict:
+    """束搜索与前缀共享蒙特卡洛的内存：tracemalloc 峰值，以及求解后场景树缓存仍占用的内存。"""
+    s0 = Environment(cfg).initial_state()
+    codes = WeatherMonteCarlo(days=cfg.days, seed=0).sample_batch(samples)
+    tracemalloc.start()
+    try:
+        BeamSearchSolver(cfg, beam_width=40).solve_once(s0)
+        _, beam_peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        tree = ScenarioTreeSolver(cfg, beam_width=40)
+        tree.solve_batch(s0, codes)
+        retained, tree_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"samples": samples, "beam_peak_kib": beam_peak / 1024, "tree_peak_kib": (tree_peak - base) / 1024,
+            "tree_retained_kib": (retained - base) / 1024, "tree_cached_states": tree.cached_states}
+
+
+def bench_config_load(cfg, workdir: str) -> Dict:
+    path = os.path.join(workdir, f"{cfg.level_name}.xlsx")
+    write_workbook(cfg, path)
+    cold = timeit(lambda: build_problem_config_from_excel(path), repeat=2)
+    load_problem_config(path)
+    warm = timeit(lambda: load_problem_config(path), repeat=5)
+    return {"cold_min_s": cold["min_s"], "warm_min_s": warm["min_s"]}
+
+
+def bench_monte_carlo(cfg, samples: int, workers: int) -> Dict:
+    t = timeit(lambda: run_monte_carlo(cfg, samples=samples, seed=0, workers=workers), repeat=1)
+    return {**t, "samples": samples, "workers": workers, "samples_per_s": samples / t["min_s"]}
+
+
+def bench_policy_eval(cfg, scenarios: int) -> Dict:
+    solver = BeamSearchSolver(cfg, beam_width=40)
+    res = solver.solve_once(solver.env.initial_state())
+    if res is None:
+        return {"scenarios": scenarios, "skipped": "no plan"}
+    cenv = CompiledEnvironment(cfg)
+    policy = PlanPolicy.from_history(res.history, cenv)
+    codes = WeatherMonteCarlo(days=cfg.days, seed=0).sample_batch(scenarios)
+
+    def run():
+        run.ev = evaluate_policy(cfg, policy, codes, cenv=cenv)
+
+    t = timeit(run)
+    return {**t, "scenarios": scenarios, "scenarios_per_s": scenarios / t["min_s"],
+            "survival_rate": run.ev.survival_rate}
+
+
+def bench_multi_player(cfg, n_strategies: int, n_players: int) -> Dict:
+    delays = delayed_departure_plans(cfg, range(n_strategies))
+    if not delays:
+        return {"profiles": 0, "skipped": "no plan"}
+    menv = MultiPlayerEnvironment(cfg, n_players)
+    plans = PlanSet(list(delays.values()), menv.cenv.env.start_node(), menv.cenv)
+    profiles = len(plans) ** n_players
+    t = timeit(lambda: payoff_tensor(menv, plans))
+    return {**t, "strategies": len(plans), "players": n_players, "profiles": profiles,
+            "profiles_per_s": profiles / t["min_s"]}
+
+
+def check_bnb_vs_dp(n_maps: int, n_nodes: int = 60, days: int = 20) -> Dict:
+    """
+    在边长 4–12 的随机地图上比较分支定界与精确 DP（行程上限真正起作用，需要在沙暴/高温日等待）。
+    mismatched_seeds 列出分支定界 cash 低于 DP（或用时更长）的地图种子，正常应为空。
+    """
+    mismatched: List[int] = []
+    dp_s = bnb_s = 0.0
+    for seed in range(n_maps):
+        cfg = make_synthetic_config(n_nodes=n_nodes, days=days, n_mines=1, n_villages=2, end_fraction=0.4,
+                                    seed=seed, edge_length=(4, 12))
+        s0 = Environment(cfg).initial_state()
+        t0 = time.perf_counter()
+        dp = DPSolver(cfg).solve_once(s0)
+        t1 = time.perf_counter()
+        bnb = BranchAndBoundSolver(cfg).solve_once(s0)
+        bnb_s += time.perf_counter() - t1
+        dp_s += t1 - t0
+        if dp is not None and (bnb is None or bnb.cash < dp.cash - 1e-6
+                               or (bnb.cash <= dp.cash + 1e-6 and bnb.day > dp.day)):
+            mismatched.append(seed)
+    return {"maps": n_maps, "mismatches": len(mismatched), "mismatched_seeds": mismatched,
+            "dp_s": dp_s, "bnb_s": bnb_s}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_suite(sizes: List[int], horizons: List[int], mc_samples: int, workers: int, check_maps: int = 25) -> List[Dict]:
+    results: List[Dict] = []
+
+    def record(name: str, params: Dict, metrics: Dict):
+        results.append({"name": name, "params": params, **metrics})
+        print(f"{name:14s} {json.dumps(params):48s} " + " ".join(
+            f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in metrics.items()))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in sizes:
+            for days in horizons:
+                cfg = make_synthetic_config(n_nodes=n, days=days, n_mines=max(1, n // 200), n_villages=max(2, n // 100))
+                params = {"nodes": n, "days": days}
+                record("env_step", params, bench_env_step(cfg, 20000))
+                record("neighbors", params, bench_neighbors(cfg, 20000))
+                record("solve_once", params, bench_solve_once(cfg, beam_width=40))
+                record("monte_carlo", params, bench_monte_carlo(cfg, mc_samples, workers))
+                record("policy_eval", params, bench_policy_eval(cfg, 100_000))
+                record("solver_memory", params, bench_solver_memory(cfg, mc_samples * 10))
+                record("multi_player", params, bench_multi_player(cfg, n_strategies=12, n_players=3))
+            record("config_load", {"nodes": n}, bench_config_load(cfg, workdir))
+    record("bnb_vs_dp", {"nodes": 60, "days": 20, "edge_length": [4, 12]}, check_bnb_vs_dp(check_maps))
+    return results
+
+
+def compare(current: List[Dict], baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["name"], json.dumps(r["params"], sort_keys=True)): r for r in json.load(f)["results"]}
+    print("\nratio vs baseline (current / baseline, <1 is faster):")
+    for r in current:
+        old = baseline.get((r["name"], json.dumps(r["params"], sort_keys=True)))
+        key = "min_s" if "min_s" in r else "cold_min_s"
+        if old and old.get(key):
+            print(f"{r['name']:14s} {json.dumps(r['params']):48s} {r[key] / old[key]:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quick", action="store_true", help="Small sizes only, for smoke runs")
+    parser.add_argument("--sizes", type=int, nargs="+", default=None, help="Node counts, default 200 1000 3000")
+    parser.add_argument("--days", type=int, nargs="+", default=None, help="Horizons, default 10 30 60")
+    parser.add_argument("--mc_samples", type=int, default=None, help="Monte Carlo samples per case")
+    parser.add_argument("--workers", type=int, default=1, help="Monte Carlo worker processes")
+    parser.add_argument("--out", type=str, default="bench_output.json", help="JSON output path")
+    parser.add_argument("--baseline", type=str, default=None, help="Previous JSON output to compare against")
+    args = parser.parse_args()
+
+    sizes = args.sizes or ([200] if args.quick else [200, 1000, 3000])
+    horizons = args.days or ([10, 30] if args.quick else [10, 30, 60])
+    mc_samples = args.mc_samples or (5 if args.quick else 20)
+
+    results = run_suite(sizes, horizons, mc_samples, args.workers, check_maps=5 if args.quick else 25)
+    payload = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    print(f"Results written to {args.out}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
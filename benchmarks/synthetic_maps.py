@@ -0,0 +1,116 @@
+"""
+可扩展的合成沙漠地图：网格骨架 + 随机弦边，保证连通；
+起点在左上角，终点取距起点约 end_fraction * days 跳的节点（使关卡在期限内可达），
+矿山/村庄随机分布在其余节点上。
+边长默认为 1（行程上限从不起作用）；edge_length=(lo, hi) 时取 [lo, hi] 内的随机整数，
+超过沙暴/高温日行程上限的边迫使路线在这些天原地等待。
+"""
+from collections import deque
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from src.configs import (
+    MapGraph, MapGraphNode, MapGraphEdge, ProblemConfig,
+    BagConfig, EconomicConfig, default_weather_rules
+)
+from src.weather_sim import WeatherMonteCarlo, codes_to_conditions
+
+
+def make_synthetic_config(
+    n_nodes: int = 500,
+    days: int = 30,
+    n_mines: int = 3,
+    n_villages: int = 5,
+    chord_ratio: float = 0.1,
+    end_fraction: float = 0.5,
+    seed: int = 0,
+    edge_length: Tuple[float, float] = (1.0, 1.0),
+) -> ProblemConfig:
+    rng = np.random.default_rng(seed)
+    width = int(np.ceil(np.sqrt(n_nodes)))
+    ids = [str(i + 1) for i in range(n_nodes)]
+
+    pairs: List[Tuple[int, int]] = []
+    for i in range(n_nodes):
+        c = i % width
+        if c + 1 < width and i + 1 < n_nodes:
+            pairs.append((i, i + 1))
+        if i + width < n_nodes:
+            pairs.append((i, i + width))
+    n_chords = int(len(pairs) * chord_ratio)
+    for a, b in rng.integers(0, n_nodes, size=(n_chords, 2)):
+        if a != b:
+            pairs.append((int(a), int(b)))
+
+    neigh: List[List[int]] = [[] for _ in range(n_nodes)]
+    for a, b in pairs:
+        neigh[a].append(b)
+        neigh[b].append(a)
+    hops = _bfs_hops(neigh, 0)
+    end = int(np.argmin(np.abs(hops - max(1, int(days * end_fraction)))))
+
+    others = np.setdiff1d(np.arange(1, n_nodes), [end])
+    special = rng.choice(others, size=n_mines + n_villages, replace=False)
+    types: Dict[int, str] = {0: "start", end: "end"}
+    types.update({int(i): "mine" for i in special[:n_mines]})
+    types.update({int(i): "village" for i in special[n_mines:]})
+
+    nodes = {
+        ids[i]: MapGraphNode(id=ids[i], name=t.capitalize(), type=t, coord=(float(i % width), float(i // width)))
+        for i, t in types.items()
+    }
+    lo, hi = edge_length
+    lengths = rng.integers(int(lo), int(hi) + 1, size=len(pairs)).astype(float) if hi > lo else np.full(len(pairs), lo)
+    edges = [MapGraphEdge(src=ids[a], dst=ids[b], distance=float(d)) for (a, b), d in zip(pairs, lengths)]
+    adjacency: Dict[str, List[Tuple[str, float]]] = {nid: [] for nid in nodes}
+    for e in edges:
+        adjacency.setdefault(e.src, []).append((e.dst, e.distance))
+        adjacency.setdefault(e.dst, []).append((e.src, e.distance))
+
+    codes = WeatherMonteCarlo(days=days, seed=seed).sample_batch(1)[0]
+    return ProblemConfig(
+        days=days,
+        bag_cfg=BagConfig(max_weight=1200.0, food_unit_weight=2.0, water_unit_weight=3.0),
+        econ_cfg=EconomicConfig(initial_cash=10000.0, base_profit=1000.0),
+        day_conditions=codes_to_conditions(codes),
+        map_graph=MapGraph(nodes=nodes, edges=edges, adjacency=adjacency),
+        level_name=f"synthetic-{n_nodes}x{days}",
+        weather_rules=default_weather_rules(),
+    )
+
+
+def _bfs_hops(neigh: List[List[int]], src: int) -> np.ndarray:
+    hops = np.full(len(neigh), -1)
+    hops[src] = 0
+    queue = deque([src])
+    while queue:
+        u = queue.popleft()
+        for v in neigh[u]:
+            if hops[v] < 0:
+                hops[v] = hops[u] + 1
+                queue.append(v)
+    return hops
+
+
+def write_workbook(cfg: ProblemConfig, path: str):
+    """按 excel_loader 期望的 Map/Nodes/Weather/Params 表写出，用于测量加载耗时。"""
+    edges = cfg.map_graph.edges
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({
+            "Node1": [int(e.src) for e in edges],
+            "Node2": [int(e.dst) for e in edges],
+            "Distance": [e.distance for e in edges],
+        }).to_excel(writer, sheet_name="Map", index=False)
+        pd.DataFrame({
+            "NodeID": [int(n.id) for n in cfg.map_graph.nodes.values()],
+            "Type": [n.name for n in cfg.map_graph.nodes.values()],
+        }).to_excel(writer, sheet_name="Nodes", index=False)
+        pd.DataFrame({
+            "Day": [d.day for d in cfg.day_conditions],
+            "Weather": [d.weather for d in cfg.day_conditions],
+        }).to_excel(writer, sheet_name="Weather", index=False)
+        pd.DataFrame({
+            "Key": ["max_weight", "init_money", "water_weight", "food_weight", "base_profit", "days_limit"],
+            "Value": [cfg.bag_cfg.max_weight, cfg.econ_cfg.initial_cash, cfg.bag_cfg.water_unit_weight,
+                      cfg.bag_cfg.food_unit_weight, cfg.econ_cfg.base_profit, cfg.days],
+        }).to_excel(writer, sheet_name="Params", index=False)
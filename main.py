@@ -1,48 +1,133 @@
 import argparse
 import os
-import pandas as pd
+import sys
+import numpy as np
 
-from src.excel_loader import build_problem_config_from_excel
+# src 中用到 dataclass(slots=True)（3.10）与 Executor.shutdown(cancel_futures=True)（3.9）
+if sys.version_info < (3, 10):
+    sys.exit("DesertQuestion requires Python 3.10 or newer")
+
+from src.excel_loader import load_problem_config
+from src.weather_generator import generate_level_conditions, level_weather_probs
+from src.solvers import SOLVERS, make_solver
+from src.models import State, Environment
+from src.monte_carlo import run_monte_carlo
+from src.compiled_env import CompiledEnvironment
+from src.policy_eval import PlanPolicy, evaluate_policy
 from src.weather_sim import WeatherMonteCarlo
-from src.weather_generator import generate_level_conditions
-from solvers import BeamSearchSolver
-from src.models import State
+from src.online import run_online
+from src.multi_env import MultiPlayerEnvironment, delayed_departure_plans, payoff_tensor, pure_nash_equilibria
+from src.policy_eval import PlanSet
+from src.batch import ALL_LEVELS, BatchJob, check_batch_output, load_manifest, run_batch, write_batch_results
+from src.output import OUTPUT_FORMATS, write_table
+from src.service import DEFAULT_PORT, SolverServer, SolverService
 
 def init_state_start(cfg) -> State:
-    env = BeamSearchSolver(cfg).env
-    start_id = env.start_node()
-    return State(day=1, position=start_id, food=0.0, water=0.0, cash=cfg.econ_cfg.initial_cash, history=[])
-
-def run_level_with_weather(cfg, samples: int, seed: int, output_prefix: str):
-    mc = WeatherMonteCarlo(days=cfg.days, seed=seed)
-    best_res = None
-    best_cash = float("-inf")
-    results = []
-
-    for i in range(samples):
-        conds = mc.generate_conditions(init_weather="Sunny")
-        for d in range(cfg.days):
-            cfg.day_conditions[d].weather = conds[d].weather
-
-        solver = BeamSearchSolver(cfg, beam_width=40)
-        s0 = init_state_start(cfg)
-        res = solver.solve_monte_carlo(s0)
-        if res:
-            cash = res.cash
-            results.append({"sample": i+1, "success": True, "cash": cash, "days_used": res.day - 1})
-            if cash > best_cash:
-                best_cash = cash
-                best_res = res
-        else:
-            results.append({"sample": i+1, "success": False, "cash": None, "days_used": None})
+    return Environment(cfg).initial_state()
 
-    pd.DataFrame(results).to_excel(f"{output_prefix}_mc_summary.xlsx", index=False)
-    if best_res:
-        pd.DataFrame(best_res.history).to_excel(f"{output_prefix}_best_path.xlsx", index=False)
-        print(f"Best cash={best_cash}, path saved to {output_prefix}_best_path.xlsx")
+def run_level_with_weather(cfg, samples: int, seed: int, output_prefix: str, solver: str = "beam", workers: int = 1,
+                           scenario_tree: bool = False, target_ci: float = None, min_samples: int = 20,
+                           resume: bool = True, output_format: str = "xlsx", forecast: bool = True):
+    # 逐样本记录追加写入 CSV；运行指纹（配置内容、天气模型与求解参数）相同的已完成样本在重跑时直接复用
+    records_path = f"{output_prefix}_mc_records.csv"
+    if not resume and os.path.exists(records_path):
+        os.remove(records_path)
+    mc = run_monte_carlo(cfg, samples=samples, seed=seed, solver=solver, workers=workers, scenario_tree=scenario_tree,
+                         stream_path=records_path, target_ci=target_ci, min_samples=min_samples, forecast=forecast)
+    # 场景树不能预知未来天气，估计的是 forecast=False 的策略，与默认的逐样本求解不是同一个量
+    estimator = "forecast" if forecast and not scenario_tree else "no forecast"
+
+    summary = mc.stats.summary()
+    write_table([summary], f"{output_prefix}_mc_summary", output_format)
+    stop = " (stopped early: CI target reached)" if mc.stopped_early else ""
+    print(f"Samples={summary['samples']}{stop} estimator={estimator} success_rate={summary['success_rate']:.3f} "
+          f"cash_mean={summary['cash_mean']:.1f} 95% CI=[{summary['cash_ci_low']:.1f}, {summary['cash_ci_high']:.1f}], "
+          f"records in {records_path}")
+    if mc.best_history:
+        path = write_table(mc.best_history, f"{output_prefix}_best_path", output_format)
+        print(f"Best cash={mc.best_cash}, path saved to {path}")
     else:
         print("No successful path found under Monte Carlo samples.")
 
+def evaluate_level_plan(cfg, samples: int, seed: int, output_prefix: str, solver: str = "beam", output_format: str = "xlsx"):
+    """在 cfg 给定的天气下求解一条路径，再在 samples 个随机天气场景上整批评估这条固定计划。"""
+    s0 = init_state_start(cfg)
+    res = make_solver(cfg, solver).solve_once(s0)
+    if res is None:
+        print("Failed to build a plan under the configured weather.")
+        return
+    cenv = CompiledEnvironment(cfg)
+    codes = WeatherMonteCarlo(days=cfg.days, seed=seed).sample_batch(samples)
+    ev = evaluate_policy(cfg, PlanPolicy.from_history(res.history, cenv), codes, init_state=s0, cenv=cenv)
+    summary = ev.summary()
+    path = write_table([summary], f"{output_prefix}_plan_eval", output_format)
+    print(" ".join(f"{k}={v:g}" for k, v in summary.items()))
+    print(f"Plan evaluation saved to {path}")
+
+def run_level_online(cfg, games: int, seed: int, output_prefix: str, level: str, output_format: str = "xlsx"):
+    """天气逐日揭晓的在线模拟：第三、四、六关按其独立同分布天气，其余关卡用默认马尔可夫天气。"""
+    probs = level_weather_probs(level)[1] if level in ("第三关", "第四关", "第六关") else None
+    mc, latency = run_online(cfg, games=games, seed=seed, probs=probs)
+    write_table(mc.records, f"{output_prefix}_online_summary", output_format)
+    wins = sum(r["success"] for r in mc.records)
+    if len(latency):
+        print(f"Online games: {wins}/{games} reached end, decision p50={np.percentile(latency, 50) * 1000:.1f} ms "
+              f"p95={np.percentile(latency, 95) * 1000:.1f} ms")
+    if mc.best_history:
+        path = write_table(mc.best_history, f"{output_prefix}_online_best_path", output_format)
+        print(f"Best cash={mc.best_cash}, path saved to {path}")
+    else:
+        print("No online game reached the end.")
+
+def run_level_multiplayer(cfg, players: int, max_delay: int, output_prefix: str, solver: str = "beam",
+                          output_format: str = "xlsx"):
+    """多人关卡（已知天气）：以错峰出发 0..max_delay 天的单人最优路径为候选策略，枚举全部组合并找纯策略纳什均衡。"""
+    delays = delayed_departure_plans(cfg, range(max_delay + 1), solver=solver)
+    if not delays:
+        print("No feasible single-player plan to build strategies from.")
+        return
+    menv = MultiPlayerEnvironment(cfg, players)
+    plans = PlanSet(list(delays.values()), menv.cenv.env.start_node(), menv.cenv)
+    payoffs = payoff_tensor(menv, plans)
+    names = list(delays)
+    rows = []
+    for profile in pure_nash_equilibria(payoffs):
+        row = {f"player{i + 1}_delay": names[s] for i, s in enumerate(profile)}
+        row.update({f"player{i + 1}_cash": float(payoffs[profile + (i,)]) for i in range(players)})
+        rows.append(row)
+    print(f"{len(plans)} strategies (departure delays {names}), {len(plans) ** players} profiles, {len(rows)} pure Nash equilibria")
+    for row in rows[:10]:
+        print(" ".join(f"{k}={v:g}" for k, v in row.items()))
+    if rows:
+        path = write_table(rows, f"{output_prefix}_equilibria", output_format)
+        print(f"Equilibria saved to {path}")
+
+def run_levels(jobs, workers: int, out: str, use_cache: bool = True):
+    results, timings = run_batch(jobs, workers=workers, use_cache=use_cache)
+    print(f"Workbooks loaded in {timings['load_seconds'] * 1000:.1f} ms, tables prepared in {timings['prepare_seconds'] * 1000:.1f} ms")
+    for r in results:
+        status = f"cash={r.cash}" if r.success else "failed"
+        print(f"{r.level} [{r.mode}/{r.solver}]: {status} ({r.seconds:.2f}s)")
+    write_batch_results(results, out)
+    print(f"Combined results saved to {out}")
+
+def serve(excel: str, port: int, max_results: int, use_cache: bool = True, data_dir: str = None):
+    """
+    常驻求解服务（仅监听 127.0.0.1），启动时预加载 excel；请求只能使用 excel 或 data_dir 内的工作簿。
+    请求格式见 src/service.py。
+    """
+    service = SolverService(use_cache=use_cache, max_results=max_results, data_dir=data_dir)
+    if os.path.exists(excel):
+        service.preload(excel)
+    server = SolverServer(service, port=port)
+    print(f"Serving on http://127.0.0.1:{server.server_address[1]} (POST /solve, GET /stats), Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--excel", type=str, default=os.path.join("data", "game_data.xlsx"),
@@ -52,9 +137,88 @@ def main():
     parser.add_argument("--seed", type=int, default=42, help="Random seed")
     parser.add_argument("--unknown_weather", action="store_true", help="Enable Monte Carlo for unknown-weather levels")
     parser.add_argument("--gen_weather", action="store_true", help="Override day_conditions by generator for specified levels")
+    parser.add_argument("--solver", type=str, default="beam", choices=SOLVERS,
+                        help="beam: beam search; bnb: branch-and-bound over the beam actions; dp: exact dynamic programming for known weather")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes for Monte Carlo samples, 0 = all CPU cores")
+    parser.add_argument("--profile", type=str, default=None,
+                        help="Write a per-layer search trace (beam solver, known weather) to this .json or .csv path")
+    parser.add_argument("--no_cache", action="store_true", help="Always parse the workbook, do not read or write <excel>.cache")
+    parser.add_argument("--scenario_tree", action="store_true",
+                        help="Share beam layers across Monte Carlo samples with common weather prefixes (beam solver, single process). "
+                             "Implies --no_forecast: it estimates the no-forecast policy, not the default per-sample one")
+    parser.add_argument("--no_forecast", action="store_true",
+                        help="With --unknown_weather: size purchases for the worst weather instead of each sample's future weather; "
+                             "per-sample runs then estimate the same quantity as --scenario_tree")
+    parser.add_argument("--time_budget", "--time-budget", type=float, default=None,
+                        help="Anytime beam search (known weather): widen the beam until this many seconds have passed, keep the best result")
+    parser.add_argument("--evaluate_plan", action="store_true",
+                        help="With --unknown_weather: solve one plan under the configured weather and score it on --samples weather draws")
+    parser.add_argument("--online", action="store_true",
+                        help="With --unknown_weather: play --samples games with weather revealed day by day, re-planning each day")
+    parser.add_argument("--target_ci", "--target-ci", type=float, default=None,
+                        help="Stop Monte Carlo early once the 95%% CI of mean cash is at most this wide")
+    parser.add_argument("--min_samples", type=int, default=20, help="Samples to run before --target_ci can stop")
+    parser.add_argument("--no_resume", action="store_true",
+                        help="Discard <prefix>_mc_records.csv instead of reusing samples already recorded there")
+    parser.add_argument("--levels", type=str, nargs="+", default=None,
+                        help="Batch mode: level names or 'all'; each uses the other flags, levels run in --workers processes")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Batch mode: JSON list of per-level settings (see src/batch.py BatchJob)")
+    parser.add_argument("--out", type=str, default="Results_batch.xlsx",
+                        help="Combined results file for batch mode (.xlsx, .json or .csv)")
+    parser.add_argument("--output_format", "--output-format", type=str, default="xlsx", choices=OUTPUT_FORMATS,
+                        help="Format of Result_* files; csv/json avoid importing pandas/openpyxl")
+    parser.add_argument("--players", type=int, default=1,
+                        help="Known weather: number of players sharing the map; >1 searches pure Nash equilibria over departure delays")
+    parser.add_argument("--max_delay", type=int, default=5, help="With --players: candidate departure delays 0..max_delay days")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run a local solve service on 127.0.0.1 that keeps workbooks, graph tables and results warm")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port for --serve")
+    parser.add_argument("--max_results", type=int, default=1024, help="With --serve: cached results kept before evicting the least recently used")
+    parser.add_argument("--data_dir", type=str, default=None,
+                        help="With --serve: directory whose workbooks requests may use besides --excel (default: --excel only)")
     args = parser.parse_args()
+    if args.scenario_tree and args.solver != "beam":
+        parser.error("--scenario_tree requires --solver beam")
+    if args.no_forecast and (not args.unknown_weather or args.solver == "dp" or args.evaluate_plan or args.online):
+        parser.error("--no_forecast requires --unknown_weather Monte Carlo with --solver beam or bnb")
+    if args.profile and (args.solver == "dp" or args.unknown_weather):
+        parser.error("--profile requires --solver beam or bnb with known weather")
+    if args.online and (args.solver != "beam" or not args.unknown_weather):
+        parser.error("--online requires --unknown_weather with --solver beam")
+    if (args.levels or args.manifest) and (args.profile or args.online or args.evaluate_plan
+                                           or args.time_budget is not None or args.scenario_tree or args.no_forecast):
+        parser.error("--levels/--manifest support --unknown_weather, --gen_weather, --solver, --samples, --seed and --target_ci only")
+    if args.players > 1 and (args.unknown_weather or args.profile or args.time_budget is not None
+                             or args.levels or args.manifest):
+        parser.error("--players requires known weather without --profile, --time_budget or batch mode")
+    if args.time_budget is not None and (args.solver != "beam" or args.unknown_weather or args.profile):
+        parser.error("--time_budget requires --solver beam with known weather and no --profile")
+    if args.levels or args.manifest:
+        try:
+            check_batch_output(args.out)
+        except ValueError as e:
+            parser.error(str(e))
 
-    cfg = build_problem_config_from_excel(args.excel, level_name=args.level)
+    if args.serve:
+        serve(args.excel, port=args.port, max_results=args.max_results, use_cache=not args.no_cache,
+              data_dir=args.data_dir)
+        return
+
+    if args.levels or args.manifest:
+        if args.manifest:
+            jobs = load_manifest(args.manifest)
+        else:
+            levels = ALL_LEVELS if args.levels == ["all"] else args.levels
+            jobs = [BatchJob(level=lv, excel=args.excel, solver=args.solver, unknown_weather=args.unknown_weather,
+                             gen_weather=args.gen_weather, samples=args.samples, seed=args.seed,
+                             target_ci=args.target_ci, min_samples=args.min_samples) for lv in levels]
+        run_levels(jobs, workers=args.workers, out=args.out, use_cache=not args.no_cache)
+        return
+
+    cfg, report = load_problem_config(args.excel, level_name=args.level, use_cache=not args.no_cache)
+    print(f"Config loaded in {report.seconds * 1000:.1f} ms ({'cache' if report.from_cache else 'workbook'})")
 
     # 针对第三、第四、第六关，按需求生成天气（独立采样），覆盖 day_conditions
     if args.gen_weather and args.level in ("第三关", "第四关", "第六关"):
@@ -63,15 +227,43 @@ def main():
         cfg.days = len(generated)
         cfg.day_conditions = generated
 
-    if args.unknown_weather:
-        run_level_with_weather(cfg, samples=args.samples, seed=args.seed, output_prefix=f"Result_{args.level}")
+    if args.players > 1:
+        run_level_multiplayer(cfg, players=args.players, max_delay=args.max_delay, output_prefix=f"Result_{args.level}",
+                              solver=args.solver, output_format=args.output_format)
+    elif args.unknown_weather and args.online:
+        run_level_online(cfg, games=args.samples, seed=args.seed, output_prefix=f"Result_{args.level}", level=args.level,
+                         output_format=args.output_format)
+    elif args.unknown_weather and args.evaluate_plan:
+        evaluate_level_plan(cfg, samples=args.samples, seed=args.seed, output_prefix=f"Result_{args.level}", solver=args.solver,
+                            output_format=args.output_format)
+    elif args.unknown_weather:
+        run_level_with_weather(cfg, samples=args.samples, seed=args.seed, output_prefix=f"Result_{args.level}", solver=args.solver, workers=args.workers,
+                               scenario_tree=args.scenario_tree, target_ci=args.target_ci, min_samples=args.min_samples,
+                               resume=not args.no_resume, output_format=args.output_format, forecast=not args.no_forecast)
     else:
-        solver = BeamSearchSolver(cfg, beam_width=40)
+        solver = make_solver(cfg, args.solver, profile=bool(args.profile))
         s0 = init_state_start(cfg)
-        res = solver.solve_once(s0)
+        if args.time_budget is not None:
+            res = solver.solve_anytime(s0, args.time_budget)
+            for r in solver.anytime_rounds:
+                if not r["completed"]:
+                    status = "stopped at deadline"
+                elif r["improved"]:
+                    status = f"cash={r['cash']}"
+                else:
+                    status = "no improvement" + (f" (best cash={r['cash']})" if r["cash"] is not None else "")
+                print(f"beam_width {r['beam_width']}: {status} ({r['seconds']:.3f}s)")
+        else:
+            res = solver.solve_once(s0)
+        for i, st in enumerate(getattr(solver, "layer_stats", []), start=1):
+            print(f"layer {i}: generated={st['generated']} duplicates={st['duplicates']} dominated={st['dominated']} kept={st['kept']}")
+        if args.profile:
+            solver.profile.write(args.profile)
+            totals = solver.profile.totals()
+            print(f"Profile written to {args.profile}: " + " ".join(f"{k}={v:g}" for k, v in totals.items()))
         if res:
             print("Reached end.", "day", res.day-1, "cash", res.cash)
-            pd.DataFrame(res.history).to_excel(f"Result_{args.level}_path.xlsx", index=False)
+            write_table(res.history, f"Result_{args.level}_path", args.output_format)
         else:
             print("Failed to reach end under known weather.")
 
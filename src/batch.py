@@ -0,0 +1,209 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, fields, replace
+from typing import Dict, List, Optional, Tuple
+from .configs import ProblemConfig
+from .excel_loader import load_problem_config
+from .graph_tables import GraphTables, graph_tables_for, register_graph_tables
+from .models import Environment
+from .output import write_table
+from .monte_carlo import run_monte_carlo
+from .solvers import SOLVERS, make_solver
+from .weather_generator import generate_level_conditions
+from .weather_sim import codes_to_conditions, encode_weather
+
+ALL_LEVELS = ("第一关", "第二关", "第三关", "第四关", "第五关", "第六关")
+# write_batch_results 支持的合并结果文件扩展名
+BATCH_OUTPUT_EXTENSIONS = (".xlsx", ".json", ".csv")
+# 有天气生成设定的关卡（见 weather_generator.level_weather_probs）
+GENERATED_WEATHER_LEVELS = ("第三关", "第四关", "第六关")
+
+
+@dataclass
+class BatchJob:
+    """批量运行中的一关；字段含义与 main.py 的同名命令行参数一致。"""
+    level: str
+    excel: str = os.path.join("data", "game_data.xlsx")
+    solver: str = "beam"
+    unknown_weather: bool = False
+    gen_weather: bool = False
+    samples: int = 200
+    seed: int = 42
+    target_ci: Optional[float] = None
+    min_samples: int = 20
+    beam_width: int = 40
+    # 逐日天气（如 ["Sunny", "Hot", ...]），给出时覆盖工作簿/生成器的天气，天数随之改变
+    weather: Optional[List[str]] = None
+
+
+@dataclass
+class BatchResult:
+    level: str
+    mode: str                  # "known" / "monte_carlo"
+    solver: str
+    success: bool
+    cash: Optional[float]
+    days_used: Optional[int]
+    seconds: float
+    stats: Dict = field(default_factory=dict)
+    history: Optional[List[Dict]] = None
+
+    def row(self) -> Dict:
+        out = {"level": self.level, "mode": self.mode, "solver": self.solver, "success": self.success,
+               "cash": self.cash, "days_used": self.days_used, "seconds": self.seconds}
+        out.update(self.stats)
+        return out
+
+
+def load_manifest(path: str) -> List[BatchJob]:
+    """
+    读取 JSON 清单：列表，每项为一关的设置（至少含 level），或 {"defaults": {...}, "levels": [...]}。
+    未知字段报错，避免拼写错误被静默忽略。
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    defaults, entries = ({}, data) if isinstance(data, list) else (data.get("defaults", {}), data["levels"])
+    return [job_from_dict({**defaults, **({"level": e} if isinstance(e, str) else e)}) for e in entries]
+
+
+# BatchJob 各字段接受的 JSON 类型（None 表示可为空）；bool 不算作 int，int 可作 float
+_FIELD_TYPES: Dict[str, Tuple] = {
+    "level": (str,), "excel": (str,), "solver": (str,),
+    "unknown_weather": (bool,), "gen_weather": (bool,),
+    "samples": (int,), "seed": (int,), "target_ci": (float, int, None), "min_samples": (int,),
+    "beam_width": (int,), "weather": (list, None),
+}
+# 须为正数的整数字段
+_POSITIVE_FIELDS = ("samples", "beam_width")
+
+
+def validate_job(job: BatchJob) -> BatchJob:
+    """检查字段类型与取值（求解器名称、样本数、束宽、天气名称），不合法时抛出 ValueError。"""
+    for name, allowed in _FIELD_TYPES.items():
+        value = getattr(job, name)
+        if value is None and None in allowed:
+            continue
+        if (isinstance(value, bool) and bool not in allowed) or not isinstance(value, tuple(t for t in allowed if t)):
+            expected = " or ".join("null" if t is None else t.__name__ for t in allowed)
+            raise ValueError(f"Job field {name!r} for level {job.level!r} must be {expected}, got {value!r}")
+    if job.solver not in SOLVERS:
+        raise ValueError(f"Unknown solver {job.solver!r} for level {job.level!r}, expected one of {', '.join(SOLVERS)}")
+    for name in _POSITIVE_FIELDS:
+        if getattr(job, name) < 1:
+            raise ValueError(f"Job field {name!r} for level {job.level!r} must be at least 1, got {getattr(job, name)}")
+    if job.weather is not None:
+        if not all(isinstance(w, str) for w in job.weather):
+            raise ValueError(f"Job field 'weather' for level {job.level!r} must be a list of weather names")
+        encode_weather(job.weather)
+    return job
+
+
+def job_from_dict(spec: Dict) -> BatchJob:
+    """由字典构造 BatchJob（清单条目、服务请求共用）；未知字段、类型或取值不合法时报错。"""
+    unknown = set(spec) - {f.name for f in fields(BatchJob)}
+    if unknown:
+        raise ValueError(f"Unknown job keys for level {spec.get('level')}: {sorted(unknown)}")
+    if "level" not in spec:
+        raise ValueError("Missing required key: level")
+    return validate_job(BatchJob(**spec))
+
+
+def level_config(base: ProblemConfig, job: BatchJob) -> ProblemConfig:
+    """基于共享的工作簿配置生成某关的配置；map_graph 保持同一对象，从而共享图表格。"""
+    cfg = replace(base, level_name=job.level, day_conditions=list(base.day_conditions))
+    if job.gen_weather and job.level in GENERATED_WEATHER_LEVELS:
+        cfg.day_conditions = generate_level_conditions(level=job.level, seed=job.seed)
+        cfg.days = len(cfg.day_conditions)
+    if job.weather is not None:
+        cfg.day_conditions = codes_to_conditions(encode_weather(job.weather))
+        cfg.days = len(cfg.day_conditions)
+    return cfg
+
+
+def solve_job(cfg: ProblemConfig, job: BatchJob) -> BatchResult:
+    t0 = time.perf_counter()
+    if job.unknown_weather:
+        mc = run_monte_carlo(cfg, samples=job.samples, seed=job.seed, solver=job.solver, beam_width=job.beam_width,
+                             target_ci=job.target_ci, min_samples=job.min_samples)
+        stats = mc.stats.summary()
+        return BatchResult(job.level, "monte_carlo", job.solver, mc.best_cash is not None, mc.best_cash,
+                           None, time.perf_counter() - t0, stats=stats, history=mc.best_history)
+    res = make_solver(cfg, job.solver, beam_width=job.beam_width).solve_once(Environment(cfg).initial_state())
+    return BatchResult(job.level, "known", job.solver, res is not None, res.cash if res else None,
+                       res.day - 1 if res else None, time.perf_counter() - t0, history=res.history if res else None)
+
+
+# 子进程内的各关配置与共享图表格，由 _init_worker 设置一次
+_WORKER_CFGS: Dict[int, ProblemConfig] = {}
+
+
+def _init_worker(cfgs: Dict[int, ProblemConfig], tables: List[GraphTables]):
+    # cfgs 与 tables 在同一次 pickle 中传入，tables[i].map_graph 与各配置的 map_graph 仍是同一对象
+    global _WORKER_CFGS
+    _WORKER_CFGS = cfgs
+    for t in tables:
+        register_graph_tables(t)
+
+
+def _solve_in_worker(task: Tuple[int, BatchJob]) -> BatchResult:
+    index, job = task
+    return solve_job(_WORKER_CFGS[index], job)
+
+
+def run_batch(jobs: List[BatchJob], workers: int = 1, use_cache: bool = True) -> Tuple[List[BatchResult], Dict]:
+    """
+    批量运行多关：每个工作簿只加载一次，同一工作簿的各关共享 map_graph 与 GraphTables；
+    workers>1 时各关在进程池中并行（表格在主进程算好后随配置一次性传给子进程）。
+    返回 (按 jobs 顺序的结果, 加载/预计算耗时)。
+    """
+    t0 = time.perf_counter()
+    workbooks: Dict[str, ProblemConfig] = {}
+    for job in jobs:
+        if job.excel not in workbooks:
+            workbooks[job.excel], _ = load_problem_config(job.excel, use_cache=use_cache)
+    load_seconds = time.perf_counter() - t0
+    cfgs = {i: level_config(workbooks[job.excel], job) for i, job in enumerate(jobs)}
+    tables = [graph_tables_for(cfg) for cfg in workbooks.values()]
+    timings = {"load_seconds": load_seconds, "prepare_seconds": time.perf_counter() - t0 - load_seconds}
+
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(jobs))
+    if workers <= 1:
+        return [solve_job(cfgs[i], job) for i, job in enumerate(jobs)], timings
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cfgs, tables)) as pool:
+        return list(pool.map(_solve_in_worker, enumerate(jobs))), timings
+
+
+def check_batch_output(path: str) -> str:
+    """合并结果文件须为 BATCH_OUTPUT_EXTENSIONS 之一，否则抛出 ValueError；在运行前调用，避免白算一轮。"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in BATCH_OUTPUT_EXTENSIONS:
+        raise ValueError(f"Unsupported batch output {path!r}, expected one of {', '.join(BATCH_OUTPUT_EXTENSIONS)}")
+    return ext
+
+
+def write_batch_results(results: List[BatchResult], path: str):
+    """
+    合并结果（results 按 jobs 顺序，job 列为清单中的下标，同一关出现多次时据此区分）：
+    .xlsx 含 summary 表与每个任务一张路径表 "<job>_<level>"；.json 含汇总与路径；.csv 只写汇总。
+    """
+    ext = check_batch_output(path)
+    rows = [{"job": i, **r.row()} for i, r in enumerate(results)]
+    if ext == ".xlsx":
+        import pandas as pd
+        with pd.ExcelWriter(path) as writer:
+            pd.DataFrame(rows).to_excel(writer, sheet_name="summary", index=False)
+            for i, r in enumerate(results):
+                if r.history:
+                    pd.DataFrame(r.history).to_excel(writer, sheet_name=f"{i}_{r.level}"[:31], index=False)
+    elif ext == ".json":
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump([{**row, "history": r.history} for row, r in zip(rows, results)], f, indent=2, ensure_ascii=False)
+    else:
+        written = write_table(rows, path[:-len(ext)], "csv")
+        if written != path:
+            # 扩展名大小写不同（如 .CSV）时仍写到用户给出的路径
+            os.replace(written, path)
@@ -0,0 +1,299 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .configs import ProblemConfig, WEATHER_TYPES
+from .models import Environment, State, Action, StepRecord, RESOURCE_EPS, REJECT_REASONS, weather_costs
+from .graph_tables import GraphTables, graph_tables_for, UNREACHABLE
+
+
+@dataclass
+class StateBatch:
+    """结构体数组形式的一批状态；pos 为 GraphTables 中的节点下标。"""
+    day: np.ndarray
+    pos: np.ndarray
+    food: np.ndarray
+    water: np.ndarray
+    cash: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    def take(self, idx: np.ndarray) -> "StateBatch":
+        return StateBatch(self.day[idx], self.pos[idx], self.food[idx], self.water[idx], self.cash[idx])
+
+    @classmethod
+    def from_states(cls, states: List[State], index) -> "StateBatch":
+        return cls(
+            day=np.array([s.day for s in states], dtype=np.int32),
+            pos=np.array([index[s.position] for s in states], dtype=np.int32),
+            food=np.array([s.food for s in states], dtype=float),
+            water=np.array([s.water for s in states], dtype=float),
+            cash=np.array([s.cash for s in states], dtype=float),
+        )
+
+
+@dataclass
+class ActionBatch:
+    """结构体数组形式的一批动作；next_node = -1 表示停留。"""
+    next_node: np.ndarray
+    buy_food: np.ndarray
+    buy_water: np.ndarray
+    sell_food: np.ndarray
+    sell_water: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.next_node)
+
+    @classmethod
+    def from_actions(cls, actions: List[Action], index) -> "ActionBatch":
+        return cls(
+            next_node=np.array([
+                index[a.next_node_id] if (not a.rest and a.next_node_id) else -1 for a in actions
+            ], dtype=np.int32),
+            buy_food=np.array([a.buy_food for a in actions], dtype=float),
+            buy_water=np.array([a.buy_water for a in actions], dtype=float),
+            sell_food=np.array([a.sell_food for a in actions], dtype=float),
+            sell_water=np.array([a.sell_water for a in actions], dtype=float),
+        )
+
+    def take(self, idx: np.ndarray) -> "ActionBatch":
+        return ActionBatch(self.next_node[idx], self.buy_food[idx], self.buy_water[idx],
+                           self.sell_food[idx], self.sell_water[idx])
+
+    def to_actions(self, node_ids: List[str]) -> List[Action]:
+        return [
+            Action(next_node_id=node_ids[n] if n >= 0 else None, rest=n < 0,
+                   buy_food=float(bf), buy_water=float(bw), sell_food=float(sf), sell_water=float(sw))
+            for n, bf, bw, sf, sw in zip(self.next_node.tolist(), self.buy_food, self.buy_water,
+                                         self.sell_food, self.sell_water)
+        ]
+
+    @classmethod
+    def concat(cls, batches: List["ActionBatch"]) -> "ActionBatch":
+        return cls(*(np.concatenate([getattr(b, f) for b in batches])
+                     for f in ("next_node", "buy_food", "buy_water", "sell_food", "sell_water")))
+
+
+@dataclass
+class Layer:
+    """
+    搜索中的一层状态：结构体数组 + 指向上一层的行号，不为每个状态创建 State / StepRecord，
+    只在需要完整路径时（结果、导出）由 CompiledEnvironment.materialize 还原。
+    根层只有一行，对应调用方传入的 root。
+    """
+    states: StateBatch
+    parent: Optional[np.ndarray] = None      # 上一层中的行号
+    actions: Optional[ActionBatch] = None    # 从父状态到本行所用的动作
+    weather: Optional[str] = None            # 走出上一层那天的天气
+    prev: Optional["Layer"] = None
+    root: Optional[State] = None
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def take(self, idx: np.ndarray) -> "Layer":
+        if self.prev is None:
+            return Layer(self.states.take(idx), root=self.root)
+        return Layer(self.states.take(idx), self.parent[idx], self.actions.take(idx), self.weather, self.prev)
+
+
+class CompiledEnvironment:
+    """
+    Environment 的数组版本：节点映射为整数，邻接表存为 CSR，逐日行程/消耗上限预先算好，
+    step_batch 对整批 (state, action) 一次性按 Environment.step 的规则推进。
+    天气改变后需调用 refresh_weather / refresh_day。
+    """
+
+    def __init__(self, cfg: ProblemConfig, tables: Optional[GraphTables] = None):
+        self.cfg = cfg
+        self.env = Environment(cfg)
+        self.tables = tables or graph_tables_for(cfg)
+        self.node_ids = self.tables.node_ids
+        self.index = self.tables.index
+        n = len(self.node_ids)
+
+        # CSR 邻接：每行按目标下标排序，使 src*n+dst 的边键全局有序
+        indptr = [0]
+        indices: List[int] = []
+        dists: List[float] = []
+        for nid in self.node_ids:
+            row = sorted((self.index[dst], dist) for dst, dist in self.tables.neighbors[nid])
+            indices.extend(d for d, _ in row)
+            dists.extend(w for _, w in row)
+            indptr.append(len(indices))
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int32)
+        self.distances = np.array(dists, dtype=float)
+        src = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.indptr))
+        self.edge_keys = src * n + self.indices
+        self._edge_dist = dict(zip(self.edge_keys.tolist(), dists))
+
+        graph = self.env.map_graph
+        self.is_end = np.zeros(n, dtype=bool)
+        self.is_end[self.index[self.env.end_node()]] = True
+        self.has_supply = np.zeros(n, dtype=bool)
+        self.price_food = np.zeros(n)
+        self.price_water = np.zeros(n)
+        self.sell_food = np.zeros(n)
+        self.sell_water = np.zeros(n)
+        for nid, node in graph.nodes.items():
+            if node.supply:
+                i = self.index[nid]
+                self.has_supply[i] = True
+                self.price_food[i] = node.supply.buy_price_food
+                self.price_water[i] = node.supply.buy_price_water
+                self.sell_food[i] = node.supply.sell_price_food or 0.0
+                self.sell_water[i] = node.supply.sell_price_water or 0.0
+        self.days_to_end = self.tables.hops_to[self.tables.end_id].astype(np.int64)
+        # 到最近补给点或终点的最少天数（自身为补给点时为 0），用于估算补给量
+        self.days_to_stop = self.days_to_end.copy()
+        for nid in self.tables.hops_to:
+            if self.has_supply[self.index[nid]]:
+                np.minimum(self.days_to_stop, self.tables.hops_to[nid], out=self.days_to_stop)
+
+        # 按天气编码（WEATHER_TYPES 顺序）的单日行程上限与消耗，供逐行天气的批量推进使用
+        self.code_travel, self.code_food, self.code_water = (
+            np.array(col) for col in zip(*(weather_costs(cfg, w) for w in WEATHER_TYPES))
+        )
+
+        self.max_travel = np.zeros(cfg.days)
+        self.food_cons = np.zeros(cfg.days)
+        self.water_cons = np.zeros(cfg.days)
+        self.weather: List[Optional[str]] = [None] * cfg.days
+        # arrival_days 的表格按当前天气缓存，refresh_day 后失效
+        self._arrival: Dict[str, np.ndarray] = {}
+        self.refresh_weather()
+
+    def refresh_day(self, day_idx: int):
+        self.max_travel[day_idx], self.food_cons[day_idx], self.water_cons[day_idx] = self.env._apply_weather(day_idx)
+        self.weather[day_idx] = self.cfg.day_conditions[day_idx].weather
+        self._arrival.clear()
+
+    def refresh_weather(self):
+        for d in range(self.cfg.days):
+            self.refresh_day(d)
+
+    def arrival_days(self, to: str) -> np.ndarray:
+        """
+        (days + 1, n) 的最早到达表：T[d, v] 为第 d+1 天开始时位于 v，按各天实际的 max_travel
+        只走当天可通行的边（走不了就原地等待），最少几天后位于终点（to="end"）
+        或补给点/终点（to="stop"）；已在其中为 0，期限内到不了为 UNREACHABLE。
+        """
+        table = self._arrival.get(to)
+        if table is None:
+            targets = self.is_end | self.has_supply if to == "stop" else self.is_end
+            table = self._arrival[to] = self._earliest_arrival(targets)
+        return table
+
+    def _earliest_arrival(self, targets: np.ndarray) -> np.ndarray:
+        n, days = len(self.node_ids), self.cfg.days
+        table = np.full((days + 1, n), UNREACHABLE, dtype=np.int64)
+        table[:, targets] = 0
+        has_edges = np.diff(self.indptr) > 0
+        starts = self.indptr[:-1][has_edges]
+        for d in range(days - 1, -1, -1):
+            nxt = table[d + 1]
+            best = nxt.copy()
+            if len(self.indices):
+                via = np.where(self.distances <= self.max_travel[d], nxt[self.indices], UNREACHABLE)
+                best[has_edges] = np.minimum(best[has_edges], np.minimum.reduceat(via, starts))
+            table[d] = np.where(targets, 0, np.minimum(best + 1, UNREACHABLE))
+        return table
+
+    def edge_distance(self, src: np.ndarray, dst: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """批量查询边 (src, dst)：返回 (是否存在, 距离)。"""
+        if len(self.edge_keys) == 0:
+            return np.zeros(len(src), dtype=bool), np.zeros(len(src))
+        keys = src.astype(np.int64) * len(self.node_ids) + dst
+        at = np.minimum(np.searchsorted(self.edge_keys, keys), len(self.edge_keys) - 1)
+        found = self.edge_keys[at] == keys
+        return found, np.where(found, self.distances[at], 0.0)
+
+    def step_batch(self, states: StateBatch, actions: ActionBatch,
+                   rejections: Optional[Dict[str, int]] = None,
+                   codes: Optional[np.ndarray] = None, cons_mult: Optional[np.ndarray] = None,
+                   price_mult: Optional[np.ndarray] = None) -> Tuple[StateBatch, np.ndarray]:
+        """
+        与 Environment.step 规则相同的批量推进，返回 (next_states, feasible)。
+        不可行的行在 next_states 中的取值无意义。
+        传入 rejections 时按 REJECT_REASONS 累加每行首个失败原因（与 Environment.step 的检查顺序一致）。
+        传入 codes 时每行使用各自的天气编码，而不是 cfg.day_conditions 中当天的天气。
+        cons_mult / price_mult 为逐行的当日消耗与买入价倍数（多人同行、同点购买时使用，见 multi_env）。
+        """
+        day_idx = states.day - 1
+        day_ok = day_idx < self.cfg.days
+        if codes is None:
+            d = np.minimum(day_idx, self.cfg.days - 1)
+            max_travel, food_cons, water_cons = self.max_travel[d], self.food_cons[d], self.water_cons[d]
+        else:
+            max_travel, food_cons, water_cons = self.code_travel[codes], self.code_food[codes], self.code_water[codes]
+
+        moving = actions.next_node >= 0
+        found, dist = self.edge_distance(states.pos, np.maximum(actions.next_node, 0))
+        edge_ok = ~moving | found
+        travel_ok = ~moving | (dist <= max_travel)
+        next_pos = np.where(moving, actions.next_node, states.pos).astype(np.int32)
+
+        next_food = states.food + actions.buy_food - actions.sell_food
+        next_water = states.water + actions.buy_water - actions.sell_water
+        sup = self.has_supply[states.pos]
+        next_cash = states.cash.copy()
+        price_food, price_water = self.price_food[states.pos], self.price_water[states.pos]
+        if price_mult is not None:
+            price_food, price_water = price_food * price_mult, price_water * price_mult
+        next_cash -= np.where(sup, actions.buy_food * price_food, 0.0)
+        next_cash -= np.where(sup, actions.buy_water * price_water, 0.0)
+        next_cash += np.where(sup, actions.sell_food * self.sell_food[states.pos], 0.0)
+        next_cash += np.where(sup, actions.sell_water * self.sell_water[states.pos], 0.0)
+
+        bag = self.cfg.bag_cfg
+        weight = next_food * bag.food_unit_weight + next_water * bag.water_unit_weight
+        weight_ok = weight <= bag.max_weight + RESOURCE_EPS
+
+        if cons_mult is not None:
+            food_cons, water_cons = food_cons * cons_mult, water_cons * cons_mult
+        next_food -= food_cons
+        next_water -= water_cons
+        food_ok = next_food >= -RESOURCE_EPS
+        water_ok = next_water >= -RESOURCE_EPS
+        checks = (day_ok, edge_ok, travel_ok, weight_ok, food_ok, water_ok)
+        ok = np.logical_and.reduce(checks)
+
+        if rejections is not None:
+            alive = np.ones(len(ok), dtype=bool)
+            for reason, passed in zip(REJECT_REASONS, checks):
+                failed = alive & ~passed
+                rejections[reason] = rejections.get(reason, 0) + int(failed.sum())
+                alive &= passed
+
+        nxt = StateBatch(states.day + 1, next_pos, next_food, next_water, next_cash)
+        return nxt, ok
+
+    def root_layer(self, state: State) -> Layer:
+        return Layer(StateBatch.from_states([state], self.index), root=state)
+
+    def materialize(self, layer: Layer, i: int) -> State:
+        """把 layer 第 i 行还原为带父指针与 StepRecord 的 State（沿 parent 回溯到根）。"""
+        chain = []
+        while layer.prev is not None:
+            chain.append((layer, i))
+            i = int(layer.parent[i])
+            layer = layer.prev
+        s = layer.root
+        n = len(self.node_ids)
+        for lay, j in reversed(chain):
+            b, a = lay.states, lay.actions
+            pos = int(b.pos[j])
+            moved = a.next_node[j] >= 0
+            record = StepRecord(
+                s.day, s.position, self.node_ids[pos],
+                self._edge_dist[self.index[s.position] * n + pos] if moved else 0.0,
+                float(a.buy_food[j]), float(a.buy_water[j]), float(a.sell_food[j]), float(a.sell_water[j]),
+                lay.weather
+            )
+            s = State(
+                day=int(b.day[j]), position=self.node_ids[pos],
+                food=float(b.food[j]), water=float(b.water[j]), cash=float(b.cash[j]),
+                parent=s, record=record
+            )
+        return s
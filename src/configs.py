@@ -2,6 +2,8 @@ from dataclasses import dataclass
 from typing import List, Dict, Tuple, Optional
 
 WeatherType = str  # "Sunny" | "Hot" | "Sand"
+# 批量采样时天气的整数编码顺序
+WEATHER_TYPES: Tuple[WeatherType, ...] = ("Sunny", "Hot", "Sand")
 
 @dataclass
 class SupplyPoint:
@@ -1,59 +1,69 @@
-import pandas as pd
-from typing import Dict, List, Tuple, Optional
-from configs import (
+import hashlib
+import os
+import pickle
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Tuple, Optional
+from .configs import (
     MapGraph, MapGraphNode, MapGraphEdge, ProblemConfig,
     BagConfig, EconomicConfig, DayCondition, default_weather_rules, SupplyPoint
 )
 
-def load_params_sheet(xls: pd.ExcelFile) -> Dict[str, float]:
+if TYPE_CHECKING:
+    import pandas as pd
+
+# 解析逻辑或 ProblemConfig 结构变化时递增，使旧缓存失效
+LOADER_VERSION = 1
+CACHE_SUFFIX = ".cache"
+
+NODE_TYPE_MAP = {
+    "start": "start",
+    "end": "end",
+    "mine": "mine",
+    "village": "village",
+    "forbidden": "forbidden"
+}
+
+def load_params_sheet(xls: "pd.ExcelFile") -> Dict[str, float]:
+    import pandas as pd
     df = pd.read_excel(xls, "Params")
-    params: Dict[str, float] = {}
-    for _, row in df.iterrows():
-        k = str(row["Key"]).strip()
-        v = float(row["Value"])
-        params[k] = v
-    return params
-
-def load_nodes_sheet(xls: pd.ExcelFile) -> Dict[str, MapGraphNode]:
+    keys = df["Key"].astype(str).str.strip()
+    values = df["Value"].astype(float)
+    return dict(zip(keys.tolist(), values.tolist()))
+
+def load_nodes_sheet(xls: "pd.ExcelFile") -> Dict[str, MapGraphNode]:
+    import pandas as pd
     df = pd.read_excel(xls, "Nodes")
-    nodes: Dict[str, MapGraphNode] = {}
-    for _, row in df.iterrows():
-        rid = str(row["NodeID"])
-        t = str(row["Type"]).strip()
-        t_lower = t.lower()
-        type_map = {
-            "start": "start",
-            "end": "end",
-            "mine": "mine",
-            "village": "village",
-            "forbidden": "forbidden"
-        }
-        std_type = type_map.get(t_lower, "normal")
-        nodes[rid] = MapGraphNode(id=rid, name=t, type=std_type)
-    return nodes
-
-def load_map_sheet(xls: pd.ExcelFile, nodes: Dict[str, MapGraphNode]) -> Tuple[List[MapGraphEdge], Dict[str, List[Tuple[str, float]]]]:
+    ids = df["NodeID"].astype(str).tolist()
+    names = df["Type"].astype(str).str.strip()
+    std_types = names.str.lower().map(NODE_TYPE_MAP).fillna("normal").tolist()
+    return {
+        rid: MapGraphNode(id=rid, name=t, type=std)
+        for rid, t, std in zip(ids, names.tolist(), std_types)
+    }
+
+def load_map_sheet(xls: "pd.ExcelFile", nodes: Dict[str, MapGraphNode]) -> Tuple[List[MapGraphEdge], Dict[str, List[Tuple[str, float]]]]:
+    import pandas as pd
     df = pd.read_excel(xls, "Map")
-    edges: List[MapGraphEdge] = []
+    srcs = df["Node1"].astype(str).tolist()
+    dsts = df["Node2"].astype(str).tolist()
+    dists = df["Distance"].astype(float).tolist() if "Distance" in df.columns else [1.0] * len(df)
+    edges: List[MapGraphEdge] = [
+        MapGraphEdge(src=src, dst=dst, distance=dist, bidirectional=True)
+        for src, dst, dist in zip(srcs, dsts, dists)
+    ]
     adjacency: Dict[str, List[Tuple[str, float]]] = {rid: [] for rid in nodes.keys()}
-    dist_col = "Distance" if "Distance" in df.columns else None
-    for _, row in df.iterrows():
-        src = str(row["Node1"])
-        dst = str(row["Node2"])
-        dist = float(row[dist_col]) if dist_col else 1.0
-        bidirectional = True
-        e = MapGraphEdge(src=src, dst=dst, distance=dist, bidirectional=bidirectional)
-        edges.append(e)
+    for src, dst, dist in zip(srcs, dsts, dists):
         adjacency.setdefault(src, []).append((dst, dist))
-        if bidirectional:
-            adjacency.setdefault(dst, []).append((src, dist))
+        adjacency.setdefault(dst, []).append((src, dist))
     return edges, adjacency
 
-def load_weather_sheet(xls: pd.ExcelFile, days_limit: int) -> List[DayCondition]:
+def load_weather_sheet(xls: "pd.ExcelFile", days_limit: int) -> List[DayCondition]:
     """
     读取 Weather 表；若缺失或为空，则为所有天生成默认 "Sunny"。
     空表默认不会出错；若列名缺失则也走默认。
     """
+    import pandas as pd
     try:
         if "Weather" not in xls.sheet_names:
             # 缺失 Weather sheet：全 Sunny
@@ -71,11 +81,10 @@ def load_weather_sheet(xls: pd.ExcelFile, days_limit: int) -> List[DayCondition]
         # 尝试读取列
         conds: Dict[int, str] = {}
         if "Day" in df.columns and "Weather" in df.columns:
-            for _, row in df.iterrows():
-                day = int(row["Day"]) if not pd.isna(row["Day"]) else None
-                weather = str(row["Weather"]).strip() if not pd.isna(row["Weather"]) else None
-                if day is not None and weather:
-                    conds[day] = weather
+            valid = df[df["Day"].notna() & df["Weather"].notna()]
+            days = valid["Day"].astype(int).tolist()
+            weathers = valid["Weather"].astype(str).str.strip().tolist()
+            conds = {day: w for day, w in zip(days, weathers) if w}
         # 生成列表，默认 Sunny
         day_conditions = []
         for d in range(1, days_limit + 1):
@@ -92,6 +101,8 @@ def load_weather_sheet(xls: pd.ExcelFile, days_limit: int) -> List[DayCondition]
         ]
 
 def build_problem_config_from_excel(path: str, level_name: str = None) -> ProblemConfig:
+    # pandas/openpyxl 只在真正解析工作簿时导入，命中缓存的运行不需要它们
+    import pandas as pd
     xls = pd.ExcelFile(path)
     params = load_params_sheet(xls)
     nodes = load_nodes_sheet(xls)
@@ -135,3 +146,49 @@ def build_problem_config_from_excel(path: str, level_name: str = None) -> Proble
         food_base=food_base,
         water_base=water_base
     )
+
+@dataclass
+class LoadReport:
+    seconds: float
+    from_cache: bool
+    cache_path: Optional[str] = None
+    # 工作簿文件的 sha256，调用方可直接用作内容键而不必再读一遍文件
+    sha256: Optional[str] = None
+
+def _file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_problem_config(path: str, level_name: str = None, use_cache: bool = True) -> Tuple[ProblemConfig, LoadReport]:
+    """
+    带缓存的配置加载：在工作簿旁写入 <workbook>.cache（pickle），
+    以文件 sha256 与 LOADER_VERSION 为键；命中时不再经过 pandas/openpyxl 解析。
+    缓存不可写时静默退回为仅解析。report.sha256 总是给出（不用缓存时也计算）。
+    """
+    t0 = time.perf_counter()
+    cache_path = path + CACHE_SUFFIX
+    digest = _file_digest(path)
+    if use_cache and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                payload = pickle.load(f)
+            if payload.get("version") == LOADER_VERSION and payload.get("sha256") == digest:
+                cfg: ProblemConfig = payload["config"]
+                cfg.level_name = level_name
+                return cfg, LoadReport(time.perf_counter() - t0, True, cache_path, digest)
+        except Exception:
+            pass
+
+    cfg = build_problem_config_from_excel(path, level_name=level_name)
+    if use_cache:
+        try:
+            tmp = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump({"version": LOADER_VERSION, "sha256": digest, "config": cfg}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, cache_path)
+        except OSError:
+            pass
+    return cfg, LoadReport(time.perf_counter() - t0, False, cache_path if use_cache else None, digest)
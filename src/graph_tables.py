@@ -0,0 +1,107 @@
+from collections import OrderedDict, deque
+from typing import Dict, List, Tuple
+import numpy as np
+from .configs import ProblemConfig, MapGraph
+
+KEY_NODE_TYPES = ("start", "mine", "village", "end")
+UNREACHABLE = np.iinfo(np.int32).max // 2
+# graph_tables_for 最多保留的表格数，超出时淘汰最久未用的
+MAX_CACHED_TABLES = 16
+
+
+def max_travel(cfg: ProblemConfig) -> float:
+    """任一天的最大行程（未列出的天气倍率为 1.0）；超过它的边永远不可走。"""
+    return max(
+        [cfg.travel_base] + [cfg.travel_base * r.get("travel_mult", 1.0) for r in (cfg.weather_rules or {}).values()]
+    )
+
+
+class GraphTables:
+    """
+    每个配置预计算一次的图表格：
+    - 节点 id <-> 整数下标、去重后的邻接表；
+    - 各节点到每个关键节点（起点/矿山/村庄/终点）的最少天数（反向 BFS，每天至多走一条边，
+      只计入某天可通行的边），可作为可采纳启发式；
+      其中到终点的一行 hops_to[end_id] 即到终点的最少天数。
+    """
+
+    def __init__(self, cfg: ProblemConfig):
+        graph = cfg.map_graph
+        self.map_graph = graph
+        self.node_ids: List[str] = list(dict.fromkeys(list(graph.nodes.keys()) + list(graph.adjacency.keys())))
+        self.index: Dict[str, int] = {nid: i for i, nid in enumerate(self.node_ids)}
+        # 与 Environment.step 一致：dict() 去重，重复边以最后一条为准
+        self.neighbors: Dict[str, List[Tuple[str, float]]] = {
+            nid: list(dict(graph.adjacency.get(nid, [])).items()) for nid in self.node_ids
+        }
+
+        self.start_id = self._first_of_type("start", self.node_ids[0])
+        self.end_id = self._first_of_type("end", self.node_ids[-1])
+        self.key_nodes: List[str] = [
+            nid for nid in self.node_ids
+            if graph.nodes.get(nid) is not None and graph.nodes[nid].type in KEY_NODE_TYPES
+        ]
+
+        self.max_travel = max_travel(cfg)
+        # 反向邻接（只含某天可通行的边），用于求各节点到关键节点的最短跳数
+        self._reverse: Dict[str, List[Tuple[str, float]]] = {nid: [] for nid in self.node_ids}
+        for src, neigh in self.neighbors.items():
+            for dst, dist in neigh:
+                if dist <= self.max_travel:
+                    self._reverse[dst].append((src, dist))
+
+        self.hops_to: Dict[str, np.ndarray] = {}
+        for k in self.key_nodes + ([self.end_id] if self.end_id not in self.key_nodes else []):
+            self.hops_to[k] = self._row(self._bfs_to(k))
+
+    def _first_of_type(self, node_type: str, default: str) -> str:
+        for nid, n in self.map_graph.nodes.items():
+            if n.type == node_type:
+                return nid
+        return default
+
+    def _bfs_to(self, target: str) -> Dict[str, int]:
+        lengths = {target: 0}
+        queue = deque([target])
+        while queue:
+            u = queue.popleft()
+            for v, _ in self._reverse[u]:
+                if v not in lengths:
+                    lengths[v] = lengths[u] + 1
+                    queue.append(v)
+        return lengths
+
+    def _row(self, lengths: Dict[str, int]) -> np.ndarray:
+        row = np.full(len(self.node_ids), UNREACHABLE, dtype=np.int32)
+        for nid, v in lengths.items():
+            row[self.index[nid]] = v
+        return row
+
+
+# 按 (MapGraph 对象, 最大行程) 缓存，同一配置的多个求解器共享表格；
+# 表格还取决于 travel_base/weather_rules（经 max_travel），因此二者都入键。
+# 有界 LRU：常驻服务重载工作簿后，旧 MapGraph 及其表格会被逐步淘汰而不是一直占着内存
+_TABLES_CACHE: "OrderedDict[Tuple[int, float], Tuple[MapGraph, GraphTables]]" = OrderedDict()
+
+
+def _remember(key: Tuple[int, float], tables: GraphTables):
+    _TABLES_CACHE[key] = (tables.map_graph, tables)
+    _TABLES_CACHE.move_to_end(key)
+    while len(_TABLES_CACHE) > MAX_CACHED_TABLES:
+        _TABLES_CACHE.popitem(last=False)
+
+
+def graph_tables_for(cfg: ProblemConfig) -> GraphTables:
+    key = (id(cfg.map_graph), max_travel(cfg))
+    hit = _TABLES_CACHE.get(key)
+    if hit is not None and hit[0] is cfg.map_graph:
+        _TABLES_CACHE.move_to_end(key)
+        return hit[1]
+    tables = GraphTables(cfg)
+    _remember(key, tables)
+    return tables
+
+
+def register_graph_tables(tables: GraphTables):
+    """登记已算好的表格（例如随配置传入子进程的），之后 graph_tables_for 直接复用。"""
+    _remember((id(tables.map_graph), tables.max_travel), tables)
@@ -0,0 +1,120 @@
+import csv
+import math
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+# 逐样本记录文件的列；run 为运行指纹（见 monte_carlo.run_fingerprint），续跑时只认指纹相同的记录
+STREAM_FIELDS = ("sample", "seed", "solver", "run", "success", "cash", "days_used")
+
+
+@dataclass
+class RunningStats:
+    """逐样本累积的统计：成功率与成功样本 cash 的均值/方差（Welford 算法）。"""
+    n: int = 0
+    successes: int = 0
+    cash_mean: float = 0.0
+    _m2: float = 0.0
+
+    def add(self, record: Dict):
+        self.n += 1
+        if not record["success"]:
+            return
+        self.successes += 1
+        delta = record["cash"] - self.cash_mean
+        self.cash_mean += delta / self.successes
+        self._m2 += delta * (record["cash"] - self.cash_mean)
+
+    @property
+    def success_rate(self) -> float:
+        return self.successes / self.n if self.n else 0.0
+
+    @property
+    def cash_std(self) -> float:
+        return math.sqrt(self._m2 / (self.successes - 1)) if self.successes > 1 else float("nan")
+
+    def cash_ci(self, z: float = 1.96) -> Tuple[float, float]:
+        """成功样本平均 cash 的正态近似置信区间。"""
+        if self.successes < 2:
+            return float("-inf"), float("inf")
+        half = z * self.cash_std / math.sqrt(self.successes)
+        return self.cash_mean - half, self.cash_mean + half
+
+    def success_ci(self, z: float = 1.96) -> Tuple[float, float]:
+        """成功率的 Wilson 置信区间。"""
+        if not self.n:
+            return 0.0, 1.0
+        p, n = self.success_rate, self.n
+        center = (p + z * z / (2 * n)) / (1 + z * z / n)
+        half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+        return max(0.0, center - half), min(1.0, center + half)
+
+    def ci_width(self, z: float = 1.96) -> float:
+        lo, hi = self.cash_ci(z)
+        return hi - lo
+
+    def summary(self, z: float = 1.96) -> Dict[str, float]:
+        cash_lo, cash_hi = self.cash_ci(z)
+        rate_lo, rate_hi = self.success_ci(z)
+        return {
+            "samples": self.n, "successes": self.successes, "success_rate": self.success_rate,
+            "success_ci_low": rate_lo, "success_ci_high": rate_hi,
+            "cash_mean": self.cash_mean if self.successes else float("nan"), "cash_std": self.cash_std,
+            "cash_ci_low": cash_lo, "cash_ci_high": cash_hi,
+        }
+
+
+class RecordStream:
+    """
+    追加写入的逐样本 CSV：每条记录写完即 flush，进程中断也不丢已完成的样本。
+    文件已存在时保留原内容继续追加，completed() 读出运行指纹相同的已完成样本供续跑；
+    seed/solver 两列只为便于阅读。表头与 STREAM_FIELDS 不同的旧文件没有可复用的记录，重新开始。
+    """
+
+    def __init__(self, path: str, seed: int, solver: str, run: str):
+        self.path = path
+        self.seed = seed
+        self.solver = solver
+        self.run = run
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new:
+            with open(path, newline="", encoding="utf-8") as f:
+                new = tuple(next(csv.reader(f), ())) != STREAM_FIELDS
+        self._file = open(path, "w" if new else "a", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=STREAM_FIELDS)
+        if new:
+            self._writer.writeheader()
+            self._file.flush()
+
+    def completed(self) -> Dict[int, Dict]:
+        """已写入的记录，按样本下标（从 0 开始）索引。"""
+        done: Dict[int, Dict] = {}
+        with open(self.path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                if row.get("run") != self.run:
+                    continue
+                success = row["success"] == "True"
+                done[int(row["sample"]) - 1] = {
+                    "sample": int(row["sample"]), "success": success,
+                    "cash": float(row["cash"]) if success else None,
+                    "days_used": int(row["days_used"]) if success else None,
+                }
+        return done
+
+    def write(self, record: Dict):
+        self._writer.writerow({**record, "seed": self.seed, "solver": self.solver, "run": self.run})
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self) -> "RecordStream":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def should_stop(stats: RunningStats, target_ci: Optional[float], min_samples: int) -> bool:
+    """达到最少样本数后，平均 cash 置信区间宽度不超过 target_ci 即可提前停止。"""
+    return target_ci is not None and stats.n >= min_samples and stats.ci_width() <= target_ci
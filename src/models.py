@@ -1,19 +1,63 @@
-from dataclasses import dataclass
-from typing import Dict, Optional, List
+from dataclasses import dataclass, field
+from typing import Dict, Optional, List, NamedTuple, Tuple
 from .configs import ProblemConfig, MapGraphNode, SupplyPoint
 
 PositionType = str  # 节点 id
 
-@dataclass
+# 资源/负重比较的浮点容差，避免 0.6-0.2*3 之类的舍入误差误判为不可行
+RESOURCE_EPS = 1e-9
+
+# step 拒绝原因，按检查顺序排列
+REJECT_REASONS = ("day_limit", "no_edge", "over_travel", "over_weight", "out_of_food", "out_of_water")
+
+class StepRecord(NamedTuple):
+    """单日行动记录；当日结束后的 cash/food/water 取自所属 State。"""
+    day: int
+    pos: PositionType
+    next_pos: PositionType
+    move_dist: float
+    buy_food: float
+    buy_water: float
+    sell_food: float
+    sell_water: float
+    weather: Optional[str]
+
+@dataclass(slots=True)
 class State:
     day: int
     position: PositionType
     food: float
     water: float
     cash: float
-    history: List[Dict]
-
-@dataclass
+    # 父指针 + 本步记录，扩展代价与天数无关；完整路径仅在导出时回溯
+    parent: Optional["State"] = field(default=None, repr=False, compare=False)
+    record: Optional[StepRecord] = field(default=None, repr=False, compare=False)
+
+    @property
+    def history(self) -> List[Dict]:
+        rows: List[Dict] = []
+        s = self
+        while s is not None and s.record is not None:
+            r = s.record
+            rows.append({
+                "day": r.day,
+                "pos": r.pos,
+                "next_pos": r.next_pos,
+                "move_dist": r.move_dist,
+                "buy_food": r.buy_food,
+                "buy_water": r.buy_water,
+                "sell_food": r.sell_food,
+                "sell_water": r.sell_water,
+                "cash": s.cash,
+                "food": s.food,
+                "water": s.water,
+                "weather": r.weather
+            })
+            s = s.parent
+        rows.reverse()
+        return rows
+
+@dataclass(frozen=True, slots=True)
 class Action:
     next_node_id: Optional[str] = None
     buy_food: float = 0.0
@@ -22,10 +66,21 @@ class Action:
     sell_water: float = 0.0
     rest: bool = False
 
+def weather_costs(cfg: ProblemConfig, weather: Optional[str]) -> Tuple[float, float, float]:
+    """某种天气下一天的 (max_travel, food_cons, water_cons)。"""
+    mults = (cfg.weather_rules or {}).get(weather or "Sunny", {"travel_mult":1.0,"food_mult":1.0,"water_mult":1.0})
+
+    max_travel = cfg.travel_base * mults["travel_mult"]
+    food_cons  = cfg.food_base   * mults["food_mult"]
+    water_cons = cfg.water_base  * mults["water_mult"]
+    return max_travel, food_cons, water_cons
+
 class Environment:
     def __init__(self, cfg: ProblemConfig):
         self.cfg = cfg
         self.map_graph = cfg.map_graph
+        # 设为 dict 后 step 按 REJECT_REASONS 统计拒绝次数；None 时不统计
+        self.rejections: Optional[Dict[str, int]] = None
         # 简化：将 village/mine/start 视为可补给点，价格统一为 Params 的 food_cost/water_cost（若有）
         default_food_price = 8.0
         default_water_price = 5.0
@@ -37,6 +92,9 @@ class Environment:
                     buy_price_water=default_water_price
                 )
 
+    def initial_state(self) -> State:
+        return State(day=1, position=self.start_node(), food=0.0, water=0.0, cash=self.cfg.econ_cfg.initial_cash)
+
     def start_node(self) -> str:
         for nid, n in self.map_graph.nodes.items():
             if n.type == "start":
@@ -54,19 +112,17 @@ class Environment:
         return node is not None and node.type == "end"
 
     def _apply_weather(self, day_idx: int):
-        day = self.cfg.day_conditions[day_idx]
-        weather = day.weather or "Sunny"
-        mults = (self.cfg.weather_rules or {}).get(weather, {"travel_mult":1.0,"food_mult":1.0,"water_mult":1.0})
+        return weather_costs(self.cfg, self.cfg.day_conditions[day_idx].weather)
 
-        max_travel = self.cfg.travel_base * mults["travel_mult"]
-        food_cons  = self.cfg.food_base   * mults["food_mult"]
-        water_cons = self.cfg.water_base  * mults["water_mult"]
-        return max_travel, food_cons, water_cons
+    def _reject(self, reason: str) -> None:
+        if self.rejections is not None:
+            self.rejections[reason] = self.rejections.get(reason, 0) + 1
+        return None
 
     def step(self, state: State, action: Action) -> Optional[State]:
         day_idx = state.day - 1
         if day_idx >= self.cfg.days:
-            return None
+            return self._reject("day_limit")
 
         max_travel, food_cons, water_cons = self._apply_weather(day_idx)
 
@@ -75,10 +131,10 @@ class Environment:
         if not action.rest and action.next_node_id:
             neigh = dict(self.map_graph.adjacency.get(state.position, []))
             if action.next_node_id not in neigh:
-                return None
+                return self._reject("no_edge")
             dist = neigh[action.next_node_id]
             if dist > max_travel:
-                return None
+                return self._reject("over_travel")
             travel_dist = dist
             next_pos = action.next_node_id
 
@@ -98,31 +154,23 @@ class Environment:
 
         bag = self.cfg.bag_cfg
         weight = next_food * bag.food_unit_weight + next_water * bag.water_unit_weight
-        if weight > bag.max_weight:
-            return None
+        if weight > bag.max_weight + RESOURCE_EPS:
+            return self._reject("over_weight")
 
         # 当日消耗
         next_food -= food_cons
         next_water -= water_cons
-        if next_food < 0 or next_water < 0:
-            return None
+        if next_food < -RESOURCE_EPS:
+            return self._reject("out_of_food")
+        if next_water < -RESOURCE_EPS:
+            return self._reject("out_of_water")
 
         next_day = state.day + 1
-        next_history = list(state.history)
-        next_history.append({
-            "day": state.day,
-            "pos": state.position,
-            "next_pos": next_pos,
-            "move_dist": travel_dist,
-            "buy_food": action.buy_food,
-            "buy_water": action.buy_water,
-            "sell_food": action.sell_food,
-            "sell_water": action.sell_water,
-            "cash": next_cash,
-            "food": next_food,
-            "water": next_water,
-            "weather": self.cfg.day_conditions[day_idx].weather
-        })
+        record = StepRecord(
+            state.day, state.position, next_pos, travel_dist,
+            action.buy_food, action.buy_water, action.sell_food, action.sell_water,
+            self.cfg.day_conditions[day_idx].weather
+        )
 
         return State(
             day=next_day,
@@ -130,5 +178,6 @@ class Environment:
             food=next_food,
             water=next_water,
             cash=next_cash,
-            history=next_history
+            parent=state,
+            record=record
         )
\ No newline at end of file
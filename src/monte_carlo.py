@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, field, replace
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Iterator, Optional, Tuple
+import numpy as np
+from .configs import ProblemConfig
+from .models import Environment, State
+from .solvers import make_solver
+from .scenario_tree import ScenarioTreeSolver
+from .weather_sim import WeatherMonteCarlo
+from .mc_stream import RunningStats, RecordStream, should_stop
+
+
+@dataclass
+class MonteCarloResult:
+    records: List[Dict] = field(default_factory=list)
+    best_cash: Optional[float] = None
+    best_history: Optional[List[Dict]] = None
+    best_sample: Optional[int] = None
+    stats: RunningStats = field(default_factory=RunningStats)
+    # 因置信区间达标而提前停止
+    stopped_early: bool = False
+
+
+# 子进程内的配置副本，由 _init_worker 在进程启动时设置一次
+_WORKER_CFG: Optional[ProblemConfig] = None
+_WORKER_OPTS: Dict = {}
+
+
+def _init_worker(cfg: ProblemConfig, opts: Dict):
+    global _WORKER_CFG, _WORKER_OPTS
+    _WORKER_CFG = cfg
+    _WORKER_OPTS = opts
+
+
+def run_fingerprint(cfg: ProblemConfig, params: Dict) -> str:
+    """
+    一次蒙特卡洛运行的指纹（sha256）：配置内容（地图、参数、天气规则、天数与天气）、
+    天气模型（WeatherMonteCarlo 的初始/转移概率）与 params 中的求解参数。
+    流式记录只在指纹相同时复用，改动工作簿、--excel、--gen_weather 或任一参数都会重新求解。
+    样本数不入指纹：SeedSequence.spawn 的第 i 个子序列与总数无关，小规模运行的记录在加大 samples 后仍然有效。
+    """
+    graph = cfg.map_graph
+    model = WeatherMonteCarlo(days=cfg.days, seed=0)
+    payload = {
+        "config": {
+            "days": cfg.days, "bag": asdict(cfg.bag_cfg), "econ": asdict(cfg.econ_cfg),
+            "weather_rules": cfg.weather_rules, "base": [cfg.travel_base, cfg.food_base, cfg.water_base],
+            "weather": [c.weather for c in cfg.day_conditions],
+            "nodes": sorted((n.id, n.type) for n in graph.nodes.values()),
+            "adjacency": sorted((src, dst, dist) for src, neigh in graph.adjacency.items() for dst, dist in neigh),
+        },
+        "weather_model": {"base_probs": model.base_probs, "transition": model.transition},
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _record(index: int, res: Optional[State]) -> Tuple[Dict, Optional[State]]:
+    if res:
+        return {"sample": index + 1, "success": True, "cash": res.cash, "days_used": res.day - 1}, res
+    return {"sample": index + 1, "success": False, "cash": None, "days_used": None}, None
+
+
+def solve_sample(cfg: ProblemConfig, index: int, seed_seq: np.random.SeedSequence,
+                 solver: str = "beam", beam_width: int = 40, init_weather: str = "Sunny",
+                 forecast: bool = True) -> Tuple[Dict, Optional[State]]:
+    """
+    求解单个样本。天气序列只由 seed_seq 决定，且不修改传入的 cfg，
+    因此串行与并行结果逐位一致。
+    """
+    conds = WeatherMonteCarlo(days=cfg.days, seed=seed_seq).generate_conditions(init_weather=init_weather)
+    sample_cfg = replace(cfg, day_conditions=conds)
+    s0 = Environment(sample_cfg).initial_state()
+    return _record(index, make_solver(sample_cfg, solver, beam_width=beam_width, forecast=forecast).solve_monte_carlo(s0))
+
+
+def _solve_in_worker(task: Tuple[int, np.random.SeedSequence]):
+    index, seed_seq = task
+    return solve_sample(_WORKER_CFG, index, seed_seq, **_WORKER_OPTS)
+
+
+def run_monte_carlo(cfg: ProblemConfig, samples: int, seed: int, solver: str = "beam",
+                    beam_width: int = 40, workers: int = 1, init_weather: str = "Sunny",
+                    scenario_tree: bool = False, max_cached_states: int = 200_000,
+                    forecast: bool = True, stream_path: Optional[str] = None,
+                    target_ci: Optional[float] = None, min_samples: int = 20) -> MonteCarloResult:
+    """
+    天气未知关卡的蒙特卡洛求解。
+    每个样本的种子由 SeedSequence(seed).spawn(samples) 派生；workers>1 时分发到进程池，
+    每个子进程持有自己的配置副本。workers<=0 表示使用全部 CPU。
+    forecast 为束搜索估算补给量时是否使用样本中的未来天气（见 BeamSearchSolver）。
+    scenario_tree=True 时改用前缀共享的 ScenarioTreeSolver（仅束搜索，单进程），它不能预知未来天气，
+    因此忽略 forecast、总按 forecast=False 求解：结果与 forecast=False 的逐样本求解一致，
+    与默认 forecast=True 的估计量不同，二者不能互作对照。
+
+    stream_path 给出时逐样本追加写入 CSV（见 RecordStream），records 不再留在内存中；
+    进程池中的样本一完成就写入，不等排在前面的慢样本，中断时已完成的样本都不会丢失（文件因此不按样本排序）。
+    文件里已有运行指纹（run_fingerprint）相同的样本直接复用，不重复求解。
+    target_ci 给出时，至少 min_samples 个样本后平均 cash 的 95% 置信区间宽度不超过它即停止。
+    统计与停止判断都按样本顺序进行，因此与 workers 无关。
+    """
+    seeds = np.random.SeedSequence(seed).spawn(samples)
+    if scenario_tree and solver != "beam":
+        raise ValueError("Scenario-tree mode only supports the beam solver.")
+    if scenario_tree:
+        forecast = False
+    opts = {"solver": solver, "beam_width": beam_width, "init_weather": init_weather, "forecast": forecast}
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+
+    stream = None
+    if stream_path:
+        run = run_fingerprint(cfg, {**opts, "seed": seed, "scenario_tree": scenario_tree})
+        stream = RecordStream(stream_path, seed, solver, run)
+    done = stream.completed() if stream else {}
+    pending = [i for i in range(samples) if i not in done]
+    pool: Optional[ProcessPoolExecutor] = None
+    try:
+        if scenario_tree:
+            computed = _tree_outputs(cfg, pending, seeds, beam_width, init_weather, max_cached_states)
+        elif workers == 1:
+            computed = (solve_sample(cfg, i, seeds[i], **opts) for i in pending)
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cfg, opts))
+            futures = [pool.submit(_solve_in_worker, (i, seeds[i])) for i in pending]
+            computed = (f.result() for f in as_completed(futures))
+
+        # 已完成但排在未完成样本之后的结果，按样本下标暂存
+        arrived: Dict[int, Tuple[Dict, Optional[State]]] = {}
+
+        def outputs():
+            for i in range(samples):
+                if i in done:
+                    yield done[i], None
+                    continue
+                while i not in arrived:
+                    record, res = next(computed)
+                    if stream is not None:
+                        stream.write(record)
+                    arrived[record["sample"] - 1] = (record, res)
+                yield arrived.pop(i)
+
+        result = _collect(outputs(), keep_records=stream is None, target_ci=target_ci, min_samples=min_samples)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        if stream is not None:
+            stream.close()
+
+    # 最优样本来自续跑的记录时，按其种子重新求解以还原路径（结果确定，与当初一致）
+    if result.best_cash is not None and result.best_history is None:
+        index = result.best_sample - 1
+        _, res = solve_sample(cfg, index, seeds[index], **opts)
+        result.best_history = res.history if res else None
+    return result
+
+
+def _tree_outputs(cfg: ProblemConfig, indices: List[int], seeds: List[np.random.SeedSequence], beam_width: int,
+                  init_weather: str, max_cached_states: int, chunk: int = 32) -> Iterator[Tuple[Dict, Optional[State]]]:
+    """前缀共享求解，按 chunk 个样本一批惰性产出；同一根状态的层缓存跨批复用。"""
+    tree = ScenarioTreeSolver(cfg, beam_width=beam_width, max_cached_states=max_cached_states)
+    s0 = Environment(cfg).initial_state()
+    for start in range(0, len(indices), chunk):
+        batch = indices[start:start + chunk]
+        codes = np.stack([WeatherMonteCarlo(days=cfg.days, seed=seeds[i]).sample_batch(1, init_weather)[0] for i in batch])
+        for i, res in zip(batch, tree.solve_batch(s0, codes)):
+            yield _record(i, res)
+
+
+def _collect(outputs, keep_records: bool = True, target_ci: Optional[float] = None,
+             min_samples: int = 20) -> MonteCarloResult:
+    result = MonteCarloResult()
+    best: Optional[State] = None
+    for record, res in outputs:
+        result.stats.add(record)
+        if keep_records:
+            result.records.append(record)
+        # 按样本顺序比较，取第一个最大 cash，与串行循环一致
+        if record["success"] and (result.best_cash is None or record["cash"] > result.best_cash):
+            result.best_cash = record["cash"]
+            result.best_sample = record["sample"]
+            best = res
+        if should_stop(result.stats, target_ci, min_samples):
+            result.stopped_early = True
+            break
+    if best is not None:
+        result.best_history = best.history
+    return result
@@ -0,0 +1,221 @@
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from .configs import ProblemConfig
+from .models import Environment, Action
+from .compiled_env import CompiledEnvironment, StateBatch, ActionBatch
+from .graph_tables import GraphTables
+from .policy_eval import PlanSet, history_to_actions, FAIL_TIMEOUT
+from .solvers import CASH_EPS, make_solver
+
+ACTION_FIELDS = ("next_node", "buy_food", "buy_water", "sell_food", "sell_water")
+
+
+@dataclass
+class MultiPlayerRules:
+    """
+    多人关卡（第五、六关）的相互影响规则：
+    - 同一天沿同一条有向边移动的 c 人，每人当日消耗为单人的 1 + shared_route_factor*(c-1) 倍
+      （默认 1.0，即 c 倍，对应原题“单人行走 2 倍、c 人同行 2c 倍基础消耗”）；
+    - 同一天在同一补给点购买的多人，买入价乘以 shared_buy_mult（默认 2.0，对应原题村庄价 2 倍、同买 4 倍基准价）；
+      exempt_start 为 True 时起点购买不受影响。
+    Environment.step 没有采矿动作，多人同矿分摊收益的规则不在此建模。
+    """
+    shared_route_factor: float = 1.0
+    shared_buy_mult: float = 2.0
+    exempt_start: bool = True
+
+
+@dataclass
+class JointState:
+    """B 局、每局 k 名玩家的联合状态；同一局内所有玩家处于同一天。数组形状均为 (B, k)。"""
+    day: int
+    pos: np.ndarray
+    food: np.ndarray
+    water: np.ndarray
+    cash: np.ndarray
+    alive: np.ndarray          # 动作均可行
+    done: np.ndarray           # 已到达终点
+    days_used: np.ndarray      # 到达终点用的天数，未到达为 -1
+
+    @property
+    def active(self) -> np.ndarray:
+        return self.alive & ~self.done
+
+
+class MultiPlayerEnvironment:
+    """
+    k 名玩家同时行动的环境：每天先按 MultiPlayerRules 由全体动作算出逐人的消耗与价格倍数，
+    再用 CompiledEnvironment.step_batch 一次推进所有局中所有仍在行进的玩家。
+    已到达终点或失败的玩家不再行动，也不参与当天的相互影响。
+    """
+
+    def __init__(self, cfg: ProblemConfig, n_players: int, rules: Optional[MultiPlayerRules] = None,
+                 tables: Optional[GraphTables] = None, cenv: Optional[CompiledEnvironment] = None):
+        self.cfg = cfg
+        self.n_players = n_players
+        self.rules = rules or MultiPlayerRules()
+        self.cenv = cenv or CompiledEnvironment(cfg, tables)
+        self.start = self.cenv.index[self.cenv.env.start_node()]
+
+    def initial_state(self, n_games: int) -> JointState:
+        s0 = self.cenv.env.initial_state()
+        shape = (n_games, self.n_players)
+        return JointState(
+            day=s0.day,
+            pos=np.full(shape, self.start, dtype=np.int32),
+            food=np.full(shape, s0.food), water=np.full(shape, s0.water), cash=np.full(shape, s0.cash),
+            alive=np.ones(shape, dtype=bool), done=np.zeros(shape, dtype=bool),
+            days_used=np.full(shape, -1, dtype=np.int32),
+        )
+
+    def interaction(self, pos: np.ndarray, actions: ActionBatch, active: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(B, k) 的动作 -> (消耗倍数, 买入价倍数)，均为 (B, k)。"""
+        moving = active & (actions.next_node >= 0)
+        edge = np.where(moving, pos.astype(np.int64) * len(self.cenv.node_ids) + actions.next_node, -1)
+        travellers = ((edge[:, :, None] == edge[:, None, :]) & moving[:, None, :]).sum(axis=2)
+        cons_mult = np.where(moving, 1.0 + self.rules.shared_route_factor * (travellers - 1), 1.0)
+
+        buying = active & ((actions.buy_food > 0) | (actions.buy_water > 0))
+        if self.rules.exempt_start:
+            buying &= pos != self.start
+        buyers = ((pos[:, :, None] == pos[:, None, :]) & buying[:, None, :]).sum(axis=2)
+        price_mult = np.where(buying & (buyers > 1), self.rules.shared_buy_mult, 1.0)
+        return cons_mult, price_mult
+
+    def step(self, joint: JointState, actions: ActionBatch, codes: Optional[np.ndarray] = None,
+             rejections: Optional[Dict[str, int]] = None) -> JointState:
+        """
+        actions 的各字段为 (B, k) 数组；不在行进中的玩家的动作被忽略。
+        codes 为 (B,) 的当天天气编码（同一局内玩家天气相同），为 None 时用 cfg 中当天的天气。
+        返回新的 JointState，不修改 joint。
+        """
+        active = joint.active
+        rows = np.flatnonzero(active)
+        cons_mult, price_mult = self.interaction(joint.pos, actions, active)
+        sub = StateBatch(np.full(rows.size, joint.day, dtype=np.int32), joint.pos.ravel()[rows],
+                         joint.food.ravel()[rows], joint.water.ravel()[rows], joint.cash.ravel()[rows])
+        flat = ActionBatch(*(getattr(actions, f).ravel()[rows] for f in ACTION_FIELDS))
+        row_codes = None if codes is None else np.broadcast_to(codes[:, None], active.shape).ravel()[rows]
+        nxt, ok = self.cenv.step_batch(sub, flat, rejections=rejections, codes=row_codes,
+                                       cons_mult=cons_mult.ravel()[rows], price_mult=price_mult.ravel()[rows])
+
+        out = JointState(joint.day + 1, joint.pos.copy(), joint.food.copy(), joint.water.copy(), joint.cash.copy(),
+                         joint.alive.copy(), joint.done.copy(), joint.days_used.copy())
+        moved = rows[ok]
+        for name in ("pos", "food", "water", "cash"):
+            getattr(out, name).ravel()[moved] = getattr(nxt, name)[ok]
+        out.alive.ravel()[rows[~ok]] = False
+        arrived = moved[self.cenv.is_end[nxt.pos[ok]]]
+        out.done.ravel()[arrived] = True
+        out.days_used.ravel()[arrived] = joint.day
+        return out
+
+
+@dataclass
+class ProfileEvaluation:
+    profiles: np.ndarray       # (P, k) 每局各玩家使用的计划下标
+    survived: np.ndarray       # (P, k) 是否在期限内到达终点
+    cash: np.ndarray           # (P, k) 到达终点时的 cash，未到达为 nan
+    days_used: np.ndarray      # (P, k) 未到达为 -1
+    failures: Dict[str, int] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    def payoffs(self, fail_payoff: float = 0.0) -> np.ndarray:
+        """(P, k) 收益：到达终点的 cash，未到达记为 fail_payoff。"""
+        return np.where(self.survived, self.cash, fail_payoff)
+
+
+def evaluate_profiles(menv: MultiPlayerEnvironment, plans: PlanSet, profiles: np.ndarray,
+                      codes: Optional[np.ndarray] = None) -> ProfileEvaluation:
+    """
+    同时模拟 P 局：第 p 局中玩家 i 执行 plans 中第 profiles[p, i] 条计划（规则见 PlanSet.step）。
+    codes 为 (P, days) 的逐局天气编码，为 None 时各局都用 cfg 中的天气。
+    """
+    t0 = time.perf_counter()
+    profiles = np.asarray(profiles, dtype=np.int64)
+    cfg = menv.cfg
+    if codes is not None and codes.shape[1] < cfg.days:
+        raise ValueError(f"Weather codes cover {codes.shape[1]} days, config needs {cfg.days}.")
+    joint = menv.initial_state(len(profiles))
+    cursor = np.zeros(profiles.shape, dtype=np.int64)
+    failures: Dict[str, int] = {}
+
+    for day_idx in range(cfg.days):
+        if not joint.active.any():
+            break
+        day_codes = None if codes is None else codes[:, day_idx]
+        if day_codes is None:
+            max_travel = np.full(profiles.shape, menv.cenv.max_travel[day_idx])
+        else:
+            max_travel = np.broadcast_to(menv.cenv.code_travel[day_codes][:, None], profiles.shape)
+        actions, cursor = plans.step(profiles, cursor, max_travel)
+        joint = menv.step(joint, actions, codes=day_codes, rejections=failures)
+
+    failures[FAIL_TIMEOUT] = int(joint.active.sum())
+    survived = joint.alive & joint.done
+    return ProfileEvaluation(
+        profiles=profiles,
+        survived=survived,
+        cash=np.where(survived, joint.cash, np.nan),
+        days_used=joint.days_used,
+        failures=failures,
+        seconds=time.perf_counter() - t0,
+    )
+
+
+def all_profiles(n_plans: int, n_players: int) -> np.ndarray:
+    """全部 n_plans**n_players 个策略组合，(P, k)，按字典序排列。"""
+    return np.indices((n_plans,) * n_players).reshape(n_players, -1).T
+
+
+def payoff_tensor(menv: MultiPlayerEnvironment, plans: PlanSet, fail_payoff: float = 0.0,
+                  codes: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    所有策略组合的收益张量，形状 (S,)*k + (k,)，[s_1, ..., s_k, i] 为玩家 i 的收益。
+    codes 为 (m, days) 的天气场景时取 m 个场景上的平均收益（所有组合在同一批场景上评估）。
+    """
+    k = menv.n_players
+    profiles = all_profiles(len(plans), k)
+    if codes is None:
+        payoffs = evaluate_profiles(menv, plans, profiles).payoffs(fail_payoff)
+    else:
+        m = len(codes)
+        ev = evaluate_profiles(menv, plans, np.repeat(profiles, m, axis=0), np.tile(codes, (len(profiles), 1)))
+        payoffs = ev.payoffs(fail_payoff).reshape(len(profiles), m, k).mean(axis=1)
+    return payoffs.reshape((len(plans),) * k + (k,))
+
+
+def pure_nash_equilibria(payoffs: np.ndarray, tol: float = CASH_EPS) -> List[Tuple[int, ...]]:
+    """收益张量中的纯策略纳什均衡：每名玩家的策略都是对其他人策略的最优反应（误差 tol 内）。"""
+    k = payoffs.shape[-1]
+    stable = np.ones(payoffs.shape[:-1], dtype=bool)
+    for i in range(k):
+        own = payoffs[..., i]
+        stable &= own >= own.max(axis=i, keepdims=True) - tol
+    return [tuple(int(x) for x in p) for p in np.argwhere(stable)]
+
+
+def delayed_departure_plans(cfg: ProblemConfig, delays: Sequence[int], solver: str = "beam",
+                            beam_width: int = 40, tables: Optional[GraphTables] = None) -> Dict[int, List[Action]]:
+    """
+    一组错峰出发的单人计划，作为多人博弈的候选策略：在起点停留 d 天（每天只买当天的消耗），
+    之后按单人最优求解。返回 {d: 动作序列}，无解的 d 不出现在结果中。
+    """
+    env = Environment(cfg)
+    search = make_solver(cfg, solver, beam_width=beam_width, tables=tables)
+    plans: Dict[int, List[Action]] = {}
+    for d in delays:
+        if d >= cfg.days:
+            continue
+        s = env.initial_state()
+        for day_idx in range(d):
+            _, food, water = env._apply_weather(day_idx)
+            s = env.step(s, Action(rest=True, buy_food=food, buy_water=water))
+            if s is None:
+                break
+        res = search.solve_once(s) if s is not None else None
+        if res is not None:
+            plans[d] = history_to_actions(res.history)
+    return plans
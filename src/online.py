@@ -0,0 +1,152 @@
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .configs import ProblemConfig, DayCondition, WEATHER_TYPES
+from .models import Environment, State, Action
+from .scenario_tree import ScenarioTreeSolver
+from .monte_carlo import MonteCarloResult, _record, _collect
+from .weather_sim import WeatherMonteCarlo, encode_weather
+from .weather_generator import generate_weather_codes_iid
+
+
+@dataclass
+class OnlineGame:
+    final: Optional[State]
+    decision_seconds: List[float] = field(default_factory=list)
+
+    @property
+    def success(self) -> bool:
+        return self.final is not None
+
+
+class RollingHorizonPlanner:
+    """
+    天气逐日揭晓时的在线规划：每天看到当天天气后，从当前状态对 n_scenarios 条采样的未来天气
+    用前缀共享的 ScenarioTreeSolver 求解（当天天气已知，所有场景共享第一层），
+    按各场景最优路径的第一步投票，取得票最多（并列取平均 cash 最高）的动作执行。
+    图表格、CompiledEnvironment、动作表和 Environment 在多天、多局之间复用，只改写当天天气；
+    前一天仍与今天天气一致的采样未来会被顺延保留，其余重新采样；前一天的各层在执行的那一步处改根后
+    继续使用（见 ScenarioTreeSolver._reroot），开局的层按根状态缓存、在各局之间复用；
+    所有场景都无解时沿用前一天选中的路径。
+    """
+
+    def __init__(self, cfg: ProblemConfig, n_scenarios: int = 8, beam_width: int = 20,
+                 weather: Optional[WeatherMonteCarlo] = None, seed: int = 0,
+                 max_cached_states: int = 200_000):
+        self.cfg = cfg
+        self.n_scenarios = n_scenarios
+        self.weather = weather or WeatherMonteCarlo(days=cfg.days, seed=seed)
+        self.tree = ScenarioTreeSolver(cfg, beam_width=beam_width, max_cached_states=max_cached_states)
+        # 实际执行用的 Environment：私有 day_conditions，逐日写入揭晓的天气
+        self.actual_cfg = replace(cfg, day_conditions=[
+            DayCondition(day=d + 1, max_travel_dist=0.0, food_consumption=0.0, water_consumption=0.0, weather="Sunny")
+            for d in range(cfg.days)
+        ])
+        self.env = Environment(self.actual_cfg)
+        self._reset_game()
+
+    def _reset_game(self):
+        self.revealed = np.zeros(self.cfg.days, dtype=np.int8)
+        self.futures: Optional[np.ndarray] = None
+        self.plan: List[Action] = []
+
+    def _sample_futures(self, day_idx: int) -> np.ndarray:
+        """(n_scenarios, days) 的天气编码：已揭晓的天照抄，之后的天采样（沿用前一天仍一致的样本）。"""
+        today = self.revealed[day_idx]
+        fresh = self.weather.sample_batch(self.n_scenarios, WEATHER_TYPES[int(today)])[:, :self.cfg.days - day_idx]
+        codes = np.empty((self.n_scenarios, self.cfg.days), dtype=np.int8)
+        codes[:, day_idx:] = fresh
+        if self.futures is not None:
+            keep = self.futures[:, day_idx] == today
+            codes[keep, day_idx:] = self.futures[keep, day_idx:]
+        codes[:, :day_idx + 1] = self.revealed[:day_idx + 1]
+        self.futures = codes
+        return codes
+
+    def decide(self, state: State, weather: str) -> Action:
+        """当天天气揭晓后为 state 选择当天的动作。"""
+        day_idx = state.day - 1
+        self.revealed[day_idx] = encode_weather([weather])[0]
+        results = self.tree.solve_batch(state, self._sample_futures(day_idx))
+
+        # 按第一步分组：得票（成功场景的 cash）与组内 cash 最高的完整路径
+        votes: Dict[Tuple, List[float]] = defaultdict(list)
+        paths: Dict[Tuple, Tuple[float, List[Action]]] = {}
+        for res in results:
+            if res is None or res.day <= state.day:
+                continue
+            actions = _actions_since(res, state.day)
+            first = actions[0]
+            key = (first.next_node_id, round(first.buy_food, 9), round(first.buy_water, 9))
+            votes[key].append(res.cash)
+            if key not in paths or res.cash > paths[key][0]:
+                paths[key] = (res.cash, actions)
+        if not votes:
+            return self.plan.pop(0) if self.plan else Action(rest=True)
+        best = max(votes, key=lambda k: (len(votes[k]), float(np.mean(votes[k]))))
+        actions = paths[best][1]
+        self.plan = actions[1:]
+        return actions[0]
+
+    def play(self, codes: np.ndarray, init_state: Optional[State] = None) -> OnlineGame:
+        """按给定的真实天气编码玩一局，天气逐日揭晓。"""
+        self._reset_game()
+        game = OnlineGame(final=None)
+        s = init_state or self.env.initial_state()
+        while s is not None and not self.env.reached_end(s) and s.day <= self.cfg.days:
+            day_idx = s.day - 1
+            weather = WEATHER_TYPES[int(codes[day_idx])]
+            self.actual_cfg.day_conditions[day_idx].weather = weather
+            t0 = time.perf_counter()
+            action = self.decide(s, weather)
+            game.decision_seconds.append(time.perf_counter() - t0)
+            s = self.env.step(s, action)
+        game.final = s if s is not None and self.env.reached_end(s) else None
+        return game
+
+
+def _actions_since(state: State, day: int) -> List[Action]:
+    """state 的路径中从第 day 天起的动作序列。"""
+    records = []
+    s = state
+    while s.record is not None and s.record.day >= day:
+        records.append(s.record)
+        s = s.parent
+    records.reverse()
+    return [
+        Action(next_node_id=None if r.next_pos == r.pos else r.next_pos,
+               buy_food=r.buy_food, buy_water=r.buy_water, sell_food=r.sell_food, sell_water=r.sell_water,
+               rest=r.next_pos == r.pos)
+        for r in records
+    ]
+
+
+def iid_weather_model(days: int, probs: Dict[str, float], seed: int = 0) -> WeatherMonteCarlo:
+    """独立同分布天气的 WeatherMonteCarlo：每一行转移概率都等于 probs。"""
+    return WeatherMonteCarlo(days=days, seed=seed, base_probs=probs,
+                             transition={w: probs for w in WEATHER_TYPES})
+
+
+def run_online(cfg: ProblemConfig, games: int, seed: int, probs: Optional[Dict[str, float]] = None,
+               n_scenarios: int = 8, beam_width: int = 20) -> Tuple[MonteCarloResult, np.ndarray]:
+    """
+    用同一个 RollingHorizonPlanner 连续模拟 games 局在线游戏，返回 (结果汇总, 每次决策耗时)。
+    probs 给出独立同分布天气（真实天气与规划采样都用它）；为 None 时都用默认的马尔可夫天气。
+    """
+    true_seed, plan_seed = np.random.SeedSequence(seed).spawn(2)
+    if probs is not None:
+        codes = generate_weather_codes_iid(games, cfg.days, true_seed, probs)
+        model = iid_weather_model(cfg.days, probs, seed=plan_seed)
+    else:
+        codes = WeatherMonteCarlo(days=cfg.days, seed=true_seed).sample_batch(games)
+        model = WeatherMonteCarlo(days=cfg.days, seed=plan_seed)
+    planner = RollingHorizonPlanner(cfg, n_scenarios=n_scenarios, beam_width=beam_width, weather=model)
+    latencies: List[float] = []
+    outputs = []
+    for i in range(games):
+        game = planner.play(codes[i])
+        latencies.extend(game.decision_seconds)
+        outputs.append(_record(i, game.final))
+    return _collect(outputs), np.array(latencies)
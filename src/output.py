@@ -0,0 +1,28 @@
+import csv
+import json
+from typing import Dict, List
+
+OUTPUT_FORMATS = ("xlsx", "csv", "json")
+
+
+def write_table(rows: List[Dict], stem: str, fmt: str = "xlsx") -> str:
+    """
+    把记录列表写成 <stem>.<fmt> 并返回路径。
+    csv/json 只用标准库；xlsx 才导入 pandas/openpyxl，以免每次启动都付出导入开销。
+    """
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {fmt}")
+    path = f"{stem}.{fmt}"
+    if fmt == "csv":
+        fieldnames = list(dict.fromkeys(k for row in rows for k in row))
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+    elif fmt == "json":
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2, ensure_ascii=False)
+    else:
+        import pandas as pd
+        pd.DataFrame(rows).to_excel(path, index=False)
+    return path
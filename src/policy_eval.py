@@ -0,0 +1,170 @@
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from .configs import ProblemConfig
+from .models import State, Action
+from .compiled_env import CompiledEnvironment, StateBatch, ActionBatch
+
+# 评估中额外的失败原因：期限内未到达终点
+FAIL_TIMEOUT = "timeout"
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def history_to_actions(history: List[Dict]) -> List[Action]:
+    """State.history -> 逐日动作序列。"""
+    return [
+        Action(next_node_id=None if h["next_pos"] == h["pos"] else h["next_pos"],
+               buy_food=h["buy_food"], buy_water=h["buy_water"],
+               sell_food=h["sell_food"], sell_water=h["sell_water"],
+               rest=h["next_pos"] == h["pos"])
+        for h in history
+    ]
+
+
+class PlanSet:
+    """
+    多条从同一起点出发的固定动作序列，按 (计划, 步) 存为补齐到同一长度的数组，末尾补停留。
+    step 对任意多行（各自的计划下标与进度）一次给出当天动作：
+    计划中的移动超出当天行程上限时原地停留、不购买，该步顺延到下一天。
+    """
+
+    def __init__(self, plans: List[List[Action]], start: str, cenv: CompiledEnvironment):
+        width = max((len(p) for p in plans), default=0) + 1
+        rows = [ActionBatch.from_actions(p + [Action(rest=True)] * (width - len(p)), cenv.index) for p in plans]
+        self.next_node = np.stack([r.next_node for r in rows])
+        self.buy_food = np.stack([r.buy_food for r in rows])
+        self.buy_water = np.stack([r.buy_water for r in rows])
+        self.sell_food = np.stack([r.sell_food for r in rows])
+        self.sell_water = np.stack([r.sell_water for r in rows])
+        # 每一步的移动距离：沿计划推演位置，停留为 0
+        self.distance = np.zeros(self.next_node.shape)
+        for p in range(len(plans)):
+            pos = cenv.index[start]
+            for k, nxt in enumerate(self.next_node[p].tolist()):
+                if nxt >= 0:
+                    self.distance[p, k] = cenv.edge_distance(np.array([pos]), np.array([nxt]))[1][0]
+                    pos = nxt
+
+    def __len__(self) -> int:
+        return len(self.next_node)
+
+    def step(self, plan: np.ndarray, cursor: np.ndarray, max_travel: np.ndarray) -> Tuple[ActionBatch, np.ndarray]:
+        """返回 (当天动作, 新进度)。"""
+        blocked = (self.next_node[plan, cursor] >= 0) & (self.distance[plan, cursor] > max_travel)
+        keep = ~blocked
+        out = ActionBatch(
+            np.where(keep, self.next_node[plan, cursor], -1).astype(np.int32),
+            np.where(keep, self.buy_food[plan, cursor], 0.0),
+            np.where(keep, self.buy_water[plan, cursor], 0.0),
+            np.where(keep, self.sell_food[plan, cursor], 0.0),
+            np.where(keep, self.sell_water[plan, cursor], 0.0),
+        )
+        return out, np.minimum(cursor + keep, self.next_node.shape[1] - 1)
+
+
+class PlanPolicy:
+    """
+    按日执行固定的动作序列（例如已知天气下求得的路径）；遇到走不了的移动时的处理见 PlanSet。
+    计划执行完后一直停留。
+    """
+
+    def __init__(self, actions: List[Action], start: str, cenv: CompiledEnvironment):
+        self.plans = PlanSet([actions], start, cenv)
+        self.cursor = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def from_history(cls, history: List[Dict], cenv: CompiledEnvironment) -> "PlanPolicy":
+        """由 State.history 构造计划。"""
+        start = history[0]["pos"] if history else cenv.env.start_node()
+        return cls(history_to_actions(history), start, cenv)
+
+    def reset(self, n: int):
+        self.cursor = np.zeros(n, dtype=np.int64)
+
+    def act(self, day_idx: int, rows: np.ndarray, states: StateBatch, max_travel: np.ndarray) -> ActionBatch:
+        """rows 为本日仍在行进的场景下标，states / max_travel 与之逐行对应。"""
+        out, self.cursor[rows] = self.plans.step(np.zeros(len(rows), dtype=np.int64), self.cursor[rows], max_travel)
+        return out
+
+
+@dataclass
+class PolicyEvaluation:
+    survived: np.ndarray       # (n,) 是否在期限内到达终点
+    cash: np.ndarray           # (n,) 到达终点时的 cash，未到达为 nan
+    days_used: np.ndarray      # (n,) 到达终点用的天数，未到达为 -1
+    failures: Dict[str, int] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    @property
+    def n(self) -> int:
+        return len(self.survived)
+
+    @property
+    def survival_rate(self) -> float:
+        return float(self.survived.mean()) if self.n else 0.0
+
+    def quantiles(self, qs: Sequence[float] = DEFAULT_QUANTILES) -> Dict[float, float]:
+        """存活场景的 cash 分位数。"""
+        cash = self.cash[self.survived]
+        if cash.size == 0:
+            return {q: float("nan") for q in qs}
+        return dict(zip(qs, np.quantile(cash, qs).tolist()))
+
+    def summary(self, qs: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, float]:
+        cash = self.cash[self.survived]
+        out = {
+            "scenarios": self.n,
+            "survival_rate": self.survival_rate,
+            "cash_mean": float(cash.mean()) if cash.size else float("nan"),
+            "cash_std": float(cash.std()) if cash.size else float("nan"),
+        }
+        out.update({f"cash_q{int(round(q * 100)):02d}": v for q, v in self.quantiles(qs).items()})
+        out.update({f"fail_{k}": v for k, v in self.failures.items() if v})
+        out["scenarios_per_s"] = self.n / self.seconds if self.seconds > 0 else float("inf")
+        return out
+
+
+def evaluate_policy(cfg: ProblemConfig, policy, codes: np.ndarray, init_state: Optional[State] = None,
+                    cenv: Optional[CompiledEnvironment] = None) -> PolicyEvaluation:
+    """
+    在 (n, days) 的天气编码矩阵上同时模拟 n 个场景，按 Environment 的规则逐日推进。
+    policy 需提供 reset(n) 与 act(day_idx, rows, states, max_travel) -> ActionBatch（见 PlanPolicy）。
+    某场景一旦动作不可行即记为失败，失败原因按 REJECT_REASONS 计数。
+    """
+    t0 = time.perf_counter()
+    codes = np.asarray(codes)
+    n = codes.shape[0]
+    if codes.shape[1] < cfg.days:
+        raise ValueError(f"Weather codes cover {codes.shape[1]} days, config needs {cfg.days}.")
+    cenv = cenv or CompiledEnvironment(cfg)
+    s0 = init_state or cenv.env.initial_state()
+    states = StateBatch.from_states([s0], cenv.index).take(np.zeros(n, dtype=np.int64))
+    alive = np.ones(n, dtype=bool)
+    done = cenv.is_end[states.pos].copy()
+    failures: Dict[str, int] = {}
+    policy.reset(n)
+
+    for day_idx in range(s0.day - 1, cfg.days):
+        rows = np.flatnonzero(alive & ~done)
+        if rows.size == 0:
+            break
+        sub = states.take(rows)
+        day_codes = codes[rows, day_idx]
+        actions = policy.act(day_idx, rows, sub, cenv.code_travel[day_codes])
+        nxt, ok = cenv.step_batch(sub, actions, rejections=failures, codes=day_codes)
+        alive[rows[~ok]] = False
+        moved = rows[ok]
+        for name in ("day", "pos", "food", "water", "cash"):
+            getattr(states, name)[moved] = getattr(nxt, name)[ok]
+        done[moved] = cenv.is_end[nxt.pos[ok]]
+
+    survived = alive & done
+    failures[FAIL_TIMEOUT] = int((alive & ~done).sum())
+    return PolicyEvaluation(
+        survived=survived,
+        cash=np.where(survived, states.cash, np.nan),
+        days_used=np.where(survived, states.day - s0.day, -1),
+        failures=failures,
+        seconds=time.perf_counter() - t0,
+    )
@@ -0,0 +1,63 @@
+import csv
+import json
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List
+from .models import REJECT_REASONS
+
+# 束搜索额外的拒绝原因：剩余天数内已无法到达终点
+REJECT_CANNOT_FINISH = "cannot_finish"
+# 乐观 cash 上界不超过已知最优完整解
+REJECT_BOUND = "bound"
+SEARCH_REJECT_REASONS = REJECT_REASONS + (REJECT_CANNOT_FINISH, REJECT_BOUND)
+
+
+@dataclass
+class LayerProfile:
+    day: int
+    expanded: int = 0      # 本层被扩展的 frontier 状态数
+    generated: int = 0     # 生成的 (state, action) 后继数
+    feasible: int = 0      # 通过 step 与可达性检查的后继数
+    duplicates: int = 0
+    dominated: int = 0
+    kept: int = 0
+    beam_cut: int = 0      # 因束宽截断丢弃的状态数
+    seconds: float = 0.0
+    rejections: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class SearchProfile:
+    beam_width: int
+    layers: List[LayerProfile] = field(default_factory=list)
+    seconds: float = 0.0
+    result: str = ""       # "end" / "dead"
+
+    def totals(self) -> Dict[str, float]:
+        keys = ("expanded", "generated", "feasible", "duplicates", "dominated", "kept", "beam_cut")
+        out: Dict[str, float] = {k: sum(getattr(l, k) for l in self.layers) for k in keys}
+        for reason in SEARCH_REJECT_REASONS:
+            out[f"reject_{reason}"] = sum(l.rejections.get(reason, 0) for l in self.layers)
+        out["seconds"] = self.seconds
+        return out
+
+    def rows(self) -> List[Dict]:
+        rows = []
+        for l in self.layers:
+            row = {k: v for k, v in asdict(l).items() if k != "rejections"}
+            for reason in SEARCH_REJECT_REASONS:
+                row[f"reject_{reason}"] = l.rejections.get(reason, 0)
+            rows.append(row)
+        return rows
+
+    def write(self, path: str):
+        """按扩展名写出：.json 含逐层明细与汇总，其余写逐层 CSV。"""
+        if path.lower().endswith(".json"):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"beam_width": self.beam_width, "result": self.result,
+                           "totals": self.totals(), "layers": self.rows()}, f, indent=2, ensure_ascii=False)
+            return
+        rows = self.rows()
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else ["day"])
+            writer.writeheader()
+            writer.writerows(rows)
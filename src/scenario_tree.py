@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .configs import ProblemConfig, DayCondition, WEATHER_TYPES
+from .models import State
+from .compiled_env import Layer, StateBatch
+from .solvers import BeamSearchSolver
+
+# (finished, result, frontier)，与 BeamSearchSolver.expand 的返回一致
+LayerEntry = Tuple[bool, Optional[State], Optional[Layer]]
+# 根状态 (day, position, food, water, cash)
+RootKey = Tuple
+
+
+def _entry_size(entry: LayerEntry) -> int:
+    return (len(entry[2]) if entry[2] is not None else 0) + 1
+
+
+class ScenarioTreeSolver:
+    """
+    前缀共享的蒙特卡洛束搜索。
+    束搜索第 k 层的 frontier 只取决于前 k 天的天气，因此把采样到的天气序列组织成前缀树，
+    共享前缀只扩展一次，仅在天气分叉处分支（补给量因此不能参考未来天气，求解器固定 forecast=False）。各前缀对应的层结果放入 LRU 缓存，
+    键为 (根状态, 天气前缀)，按缓存中的状态总数限制内存，跨多次 solve_batch 调用复用。
+    新的根状态恰是上一个根状态第一层中的某一行时（在线规划执行了一步），
+    先由上一个根的缓存层派生出以它为根的层（见 _reroot），不必从头扩展。
+    """
+
+    def __init__(self, cfg: ProblemConfig, beam_width: int = 40, max_cached_states: int = 200_000):
+        # 私有的 day_conditions 副本：每层扩展前只改写当天的天气，不影响调用方的 cfg
+        self.cfg = replace(cfg, day_conditions=[
+            DayCondition(day=d + 1, max_travel_dist=0.0, food_consumption=0.0, water_consumption=0.0, weather="Sunny")
+            for d in range(cfg.days)
+        ])
+        self.solver = BeamSearchSolver(self.cfg, beam_width=beam_width, forecast=False)
+        self.max_cached_states = max_cached_states
+        self.cache: "OrderedDict[Tuple[RootKey, bytes], LayerEntry]" = OrderedDict()
+        self.cached_states = 0
+        # 上一次 solve_batch 的根状态与天气编码类型，供 _reroot 使用
+        self._last_root: Optional[RootKey] = None
+        self._code_dtype: Optional[np.dtype] = None
+        self.expansions = 0
+        self.reroots = 0
+
+    def _cache_get(self, key: Tuple[RootKey, bytes]) -> Optional[LayerEntry]:
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.cache.move_to_end(key)
+        return entry
+
+    def _cache_put(self, key: Tuple[RootKey, bytes], entry: LayerEntry):
+        size = _entry_size(entry)
+        if size > self.max_cached_states:
+            return
+        self.cache[key] = entry
+        self.cached_states += size
+        while self.cached_states > self.max_cached_states:
+            _, old = self.cache.popitem(last=False)
+            self.cached_states -= _entry_size(old)
+
+    def solve_batch(self, init_state: State, codes: np.ndarray) -> List[Optional[State]]:
+        """
+        codes 为 (n_samples, days) 的天气编码（第 d 列对应第 d+1 天），返回每个样本的求解结果，
+        与对每条序列单独调用 BeamSearchSolver(forecast=False).solve_once 一致（根的层由 _reroot 派生时除外）。
+        """
+        codes = np.asarray(codes)
+        if codes.shape[1] < self.cfg.days:
+            raise ValueError(f"Weather codes cover {codes.shape[1]} days, config needs {self.cfg.days}.")
+        root = (init_state.day, init_state.position, init_state.food, init_state.water, init_state.cash)
+        if root != self._last_root and codes.dtype == self._code_dtype:
+            self._reroot(root, init_state, codes.dtype)
+        self._last_root, self._code_dtype = root, codes.dtype
+
+        results: List[Optional[State]] = [None] * codes.shape[0]
+        d0 = init_state.day - 1
+        last = self.cfg.days - init_state.day + 1
+
+        def visit(depth: int, rows: np.ndarray, frontier: Layer):
+            if depth == last:
+                res = self.solver.final_result(frontier)
+                for r in rows:
+                    results[r] = res
+                return
+            day_idx = d0 + depth
+            column = codes[rows, day_idx]
+            for code in np.unique(column):
+                sub = rows[column == code]
+                key = (root, codes[sub[0], d0:day_idx + 1].tobytes())
+                entry = self._cache_get(key)
+                if entry is None:
+                    self.cfg.day_conditions[day_idx].weather = WEATHER_TYPES[int(code)]
+                    self.solver.cenv.refresh_day(day_idx)
+                    self.solver.layer_stats = []
+                    entry = self.solver.expand(frontier)
+                    self.expansions += 1
+                    self._cache_put(key, entry)
+                finished, result, next_frontier = entry
+                if finished:
+                    for r in sub:
+                        results[r] = result
+                else:
+                    visit(depth + 1, sub, next_frontier)
+
+        visit(0, np.arange(codes.shape[0]), self.solver.cenv.root_layer(init_state))
+        return results
+
+    def _reroot(self, root: RootKey, state: State, dtype: np.dtype):
+        """
+        state 为上一个根状态在当天天气下走出的一步，且与该天气的第一层中某一行相同时，
+        由上一个根的各前缀层派生出以 state 为根的层：只保留这一行的后代（行号随之重排），
+        前缀去掉第一天的天气；没有后代的层与已结束的层不派生，需要时从上一层重新扩展。
+        派生的层是原束中属于这棵子树的部分，可能比从 state 重新搜索的束更窄。
+        """
+        old, rec = self._last_root, state.record
+        if old is None or rec is None or state.day != old[0] + 1 or rec.pos != old[1] or rec.weather not in WEATHER_TYPES:
+            return
+        first = np.array([WEATHER_TYPES.index(rec.weather)], dtype=dtype).tobytes()
+        entry = self.cache.get((old, first))
+        if entry is None or entry[2] is None:
+            return
+        top = entry[2]
+        b = top.states
+        match = np.flatnonzero((b.pos == self.solver.tables.index[state.position])
+                               & np.isclose(b.food, state.food) & np.isclose(b.water, state.water)
+                               & np.isclose(b.cash, state.cash))
+        if not match.size:
+            return
+
+        # 旧层对象 -> (派生的层, 旧行号到新行号的映射，-1 为不保留)
+        row_map = np.full(len(top), -1)
+        row_map[int(match[0])] = 0
+        derived: Dict[int, Tuple[Layer, np.ndarray]] = {
+            id(top): (Layer(StateBatch.from_states([state], self.solver.tables.index), root=state), row_map)
+        }
+
+        def restrict(layer: Layer) -> Optional[Tuple[Layer, np.ndarray]]:
+            """layer 不经由 top（例如 top 被淘汰后重新扩展过）时返回 None。"""
+            if layer.prev is None:
+                return None
+            hit = derived.get(id(layer))
+            if hit is None:
+                up = restrict(layer.prev)
+                if up is None:
+                    return None
+                prev, prev_map = up
+                parent = prev_map[layer.parent]
+                keep = np.flatnonzero(parent >= 0)
+                mapping = np.full(len(layer), -1)
+                mapping[keep] = np.arange(len(keep))
+                hit = derived[id(layer)] = (
+                    Layer(layer.states.take(keep), parent[keep], layer.actions.take(keep), layer.weather, prev), mapping
+                )
+            return hit
+
+        sources = [(prefix, frontier) for (r, prefix), (finished, _, frontier) in self.cache.items()
+                   if r == old and not finished and len(prefix) > len(first) and prefix.startswith(first)]
+        for prefix, frontier in sources:
+            key = (root, prefix[len(first):])
+            if key in self.cache:
+                continue
+            hit = restrict(frontier)
+            if hit is not None and len(hit[0]):
+                self._cache_put(key, (False, None, hit[0]))
+        self.reroots += 1
@@ -0,0 +1,256 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Hashable, Optional, Tuple, TypeVar
+from .batch import BatchJob, BatchResult, job_from_dict, level_config, solve_job, validate_job
+from .configs import ProblemConfig
+from .excel_loader import load_problem_config
+from .graph_tables import graph_tables_for
+
+DEFAULT_PORT = 8765
+# 单个请求允许的最大样本数与束宽，防止一个请求占满服务
+MAX_SAMPLES = 10000
+MAX_BEAM_WIDTH = 2000
+
+T = TypeVar("T")
+
+
+class ResultCache:
+    """按最近使用淘汰的有界结果缓存，线程安全。"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._items: "OrderedDict[Hashable, BatchResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[BatchResult]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: BatchResult):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._items), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class SolverService:
+    """
+    常驻的求解服务：工作簿配置与图表格只加载/预计算一次（文件修改后自动重载），
+    结果按 (工作簿 sha256, 关卡, 实际天气序列, 求解参数) 缓存。
+    solve 可被多个线程同时调用；相同的请求在求解中（或同一工作簿在加载中）时，后到者等待同一结果而不重复计算。
+    加载与求解都在 _lock 之外进行，_lock 只保护字典，冷加载不会挡住其他工作簿的请求或缓存命中。
+    请求只能使用 preload 过的工作簿或 data_dir 之内的工作簿（加载器会在工作簿旁读写 .cache pickle），
+    samples/beam_width 不得超过 max_samples/max_beam_width。
+    """
+
+    def __init__(self, use_cache: bool = True, max_results: int = 1024, data_dir: Optional[str] = None,
+                 max_samples: int = MAX_SAMPLES, max_beam_width: int = MAX_BEAM_WIDTH):
+        self.use_cache = use_cache
+        self.data_dir = os.path.realpath(data_dir) if data_dir else None
+        self.max_samples = max_samples
+        self.max_beam_width = max_beam_width
+        # preload 过的工作簿（realpath）
+        self._preloaded = set()
+        self.results = ResultCache(max_results)
+        # excel 路径 -> ((mtime_ns, size), sha256, 配置)
+        self._workbooks: Dict[str, Tuple[Tuple[int, int], str, ProblemConfig]] = {}
+        # 计算中的结果与加载中的工作簿（键为 ("workbook", 路径, stamp)）
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.solved = 0
+
+    def _once(self, key: Hashable, compute: Callable[[], T]) -> Tuple[T, bool]:
+        """
+        同一 key 同时只计算一次：第一个调用者在锁外执行 compute，其余等待同一 Future。
+        返回 (结果, 是否由本次调用计算)。
+        """
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = self._inflight[key] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return pending.result(), False
+        try:
+            value = compute()
+            pending.set_result(value)
+            return value, True
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def preload(self, path: str) -> Tuple[str, ProblemConfig]:
+        """启动时加载工作簿，并允许请求使用它。"""
+        path = os.path.realpath(path)
+        result = self.workbook(path)
+        with self._lock:
+            self._preloaded.add(path)
+        return result
+
+    def resolve(self, path: str) -> str:
+        """把请求中的 excel 路径解析为 realpath；既未 preload 也不在 data_dir 内时抛出 PermissionError。"""
+        real = os.path.realpath(path)
+        with self._lock:
+            if real in self._preloaded:
+                return real
+        if self.data_dir is not None and os.path.commonpath([self.data_dir, real]) == self.data_dir:
+            return real
+        raise PermissionError(f"Workbook {path!r} is not preloaded or inside the service data directory")
+
+    def check_limits(self, job: BatchJob):
+        """样本数、束宽超过服务上限时抛出 ValueError。"""
+        for name, limit in (("samples", self.max_samples), ("beam_width", self.max_beam_width)):
+            if getattr(job, name) > limit:
+                raise ValueError(f"Job field {name!r} for level {job.level!r} must be at most {limit}, got {getattr(job, name)}")
+
+    def workbook(self, path: str) -> Tuple[str, ProblemConfig]:
+        """返回 (sha256, 配置)；首次加载时顺带预计算图表格。path 不经 resolve 检查，由调用方负责。"""
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            hit = self._workbooks.get(path)
+        if hit is not None and hit[0] == stamp:
+            return hit[1], hit[2]
+
+        def load() -> Tuple[str, ProblemConfig]:
+            cfg, report = load_problem_config(path, use_cache=self.use_cache)
+            graph_tables_for(cfg)
+            with self._lock:
+                self._workbooks[path] = (stamp, report.sha256, cfg)
+            return report.sha256, cfg
+
+        return self._once(("workbook", path, stamp), load)[0]
+
+    @staticmethod
+    def cache_key(digest: str, cfg: ProblemConfig, job: BatchJob) -> Tuple:
+        # 天气取生成/覆盖之后的实际序列，gen_weather 与 weather 字段因此无需单独入键
+        weather = tuple(c.weather for c in cfg.day_conditions[:cfg.days])
+        params = (job.solver, job.beam_width, job.unknown_weather)
+        if job.unknown_weather:
+            params += (job.samples, job.seed, job.target_ci, job.min_samples)
+        return digest, job.level, cfg.days, weather, params
+
+    def solve(self, job: BatchJob) -> Tuple[BatchResult, bool]:
+        """
+        返回 (结果, 是否来自缓存)。job 先经 validate_job 与服务上限检查，不合法（如未知求解器）时抛出 ValueError，
+        工作簿不允许访问时抛出 PermissionError；两者都不求解也不入缓存。
+        """
+        validate_job(job)
+        self.check_limits(job)
+        digest, base = self.workbook(self.resolve(job.excel))
+        cfg = level_config(base, job)
+        key = self.cache_key(digest, cfg, job)
+        cached = self.results.get(key)
+        if cached is not None:
+            return cached, True
+
+        def compute() -> BatchResult:
+            result = solve_job(cfg, job)
+            self.results.put(key, result)
+            with self._lock:
+                self.solved += 1
+            return result
+
+        result, computed = self._once(key, compute)
+        return result, not computed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            workbooks = list(self._workbooks)
+            inflight = len(self._inflight)
+        return {"workbooks": workbooks, "solved": self.solved, "inflight": inflight, "cache": self.results.stats()}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    GET  /health           -> {"ok": true}
+    GET  /stats            -> 已加载工作簿与缓存命中情况
+    POST /solve  BatchJob 字段的 JSON -> BatchResult.row() + history + cached
+                 须带 Content-Type: application/json（浏览器跨站的简单请求无法设置它）
+    """
+    server: "SolverServer"
+
+    def _send(self, status: int, payload: Dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"ok": True})
+        elif self.path == "/stats":
+            self._send(200, self.server.service.stats())
+        else:
+            self._send(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/solve":
+            self._send(404, {"error": f"Unknown path: {self.path}"})
+            return
+        t0 = time.perf_counter()
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self._send(415, {"error": "Content-Type must be application/json"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            spec = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(spec, dict):
+                raise ValueError("Request body must be a JSON object")
+            result, cached = self.server.service.solve(job_from_dict(spec))
+        except PermissionError as e:
+            self._send(403, {"error": str(e)})
+            return
+        except (ValueError, TypeError, KeyError, OSError) as e:
+            self._send(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._send(200, {**result.row(), "history": result.history, "cached": cached,
+                         "service_seconds": time.perf_counter() - t0})
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+
+class SolverServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service: SolverService, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                 verbose: bool = False):
+        super().__init__((host, port), _Handler)
+        self.service = service
+        self.verbose = verbose
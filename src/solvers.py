@@ -1,47 +1,621 @@
-from typing import List, Optional
-from .config import ProblemConfig
+import math
+import time
+from typing import List, NamedTuple, Optional, Dict, Tuple
+import numpy as np
+from .configs import ProblemConfig
 from .models import Environment, State, Action
+from .graph_tables import GraphTables, graph_tables_for
+from .compiled_env import CompiledEnvironment, StateBatch, ActionBatch, Layer
+from .profiling import SearchProfile, LayerProfile, REJECT_CANNOT_FINISH, REJECT_BOUND
+
+# cash 比较的容差：差值在此以内视为相等，避免浮点误差把等价解当作改进
+CASH_EPS = 1e-6
+
+# 每个补给点状态最多保留的购买动作数，与原先 {0,2,5}^2 购买网格相同，动作数因此不超过 1+deg+9
+MAX_PURCHASE_ROWS = 9
+
+# make_solver 接受的求解器名称
+SOLVERS = ("beam", "bnb", "dp")
+
+
+def _better(cash: float, day: int, best: Optional[State]) -> bool:
+    """(cash, day) 是否优于 best：cash 更高者更优，cash 相同取用时少者。"""
+    if best is None or cash > best.cash + CASH_EPS:
+        return True
+    return cash >= best.cash - CASH_EPS and day < best.day
+
 
 class BeamSearchSolver:
-    def __init__(self, cfg: ProblemConfig, beam_width: int = 30):
+    def __init__(self, cfg: ProblemConfig, beam_width: int = 30, round_digits: int = 2,
+                 tables: Optional[GraphTables] = None, profile: bool = False, forecast: bool = True):
         self.cfg = cfg
-        self.env = Environment(cfg)
+        self.tables = tables or graph_tables_for(cfg)
+        self.cenv = CompiledEnvironment(cfg, tables=self.tables)
+        self.env = self.cenv.env
         self.beam_width = beam_width
+        # 置换表键中 food/water 的保留小数位
+        self.round_digits = round_digits
+        # 每层剪枝统计：generated / duplicates / dominated / kept
+        self.layer_stats: List[Dict[str, int]] = []
+        # 每个节点（按整数下标）的移动/停留动作表，按需构建后复用；补给量随状态另行生成
+        self._move_tables: List[Optional[ActionBatch]] = [None] * len(self.tables.node_ids)
+        # forecast=True 时按 cfg 中已知的未来天气估算补给；False 时未来各天按最坏天气倍率估算，
+        # 只依赖当天及以前的天气（前缀共享的 ScenarioTreeSolver 需要这一点）
+        self.forecast = forecast
+        rules = list((cfg.weather_rules or {}).values()) or [{"food_mult": 1.0, "water_mult": 1.0}]
+        self.worst_food = cfg.food_base * max([1.0] + [r.get("food_mult", 1.0) for r in rules])
+        self.worst_water = cfg.water_base * max([1.0] + [r.get("water_mult", 1.0) for r in rules])
+        # profile=True 时 solve_once 记录逐层计数、拒绝原因与耗时
+        self.profiling = profile
+        self.profile: Optional[SearchProfile] = None
+        # 最近一次搜索是否因截止时间中断、是否有层被束宽截断（未截断时加宽不会改变结果）
+        self.timed_out = False
+        self.beam_cut = False
+        # solve_anytime 每一轮的记录：beam_width / seconds / completed / improved / cash（该轮结束时的最优 cash）
+        self.anytime_rounds: List[Dict] = []
+        # 已知最优完整解；设置后 expand 剪掉乐观上界低于它（或相同却不能更早到达）的状态
+        self.incumbent: Optional[State] = None
+        # Environment.step 没有采矿动作，不产生收入，上界的收益项为 0；
+        # 若加入采矿，应改为 cfg.econ_cfg.base_profit（每个可采矿日的收益上限）
+        self.income_per_day = 0.0
+        supply = self.cenv.has_supply
+        self.min_price_food = float(self.cenv.price_food[supply].min()) if supply.any() else np.inf
+        self.min_price_water = float(self.cenv.price_water[supply].min()) if supply.any() else np.inf
+
+    def move_table(self, node: int) -> ActionBatch:
+        table = self._move_tables[node]
+        if table is None:
+            neigh = self.tables.neighbors.get(self.tables.node_ids[node], [])
+            table = ActionBatch.from_actions([Action(rest=True)] + [Action(next_node_id=nid) for nid, _ in neigh],
+                                             self.tables.index)
+            self._move_tables[node] = table
+        return table
+
+    def _need(self, day_idx: np.ndarray, horizon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """从 day_idx 起 horizon 天的 (food, water) 消耗：当天按实际天气，之后按预报或最坏倍率。"""
+        cenv = self.cenv
+        today_f, today_w = cenv.food_cons[day_idx], cenv.water_cons[day_idx]
+        if self.forecast:
+            cum_f = np.concatenate([[0.0], np.cumsum(cenv.food_cons)])
+            cum_w = np.concatenate([[0.0], np.cumsum(cenv.water_cons)])
+            end = np.minimum(day_idx + horizon, self.cfg.days)
+            return today_f + cum_f[end] - cum_f[day_idx + 1], today_w + cum_w[end] - cum_w[day_idx + 1]
+        rest = np.maximum(np.minimum(horizon, self.cfg.days - day_idx) - 1, 0)
+        return today_f + rest * self.worst_food, today_w + rest * self.worst_water
+
+    def _clip_purchase(self, src: StateBatch, bf: np.ndarray, bw: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """按现金与背包剩余容量等比例缩减购买量。"""
+        cenv, bag = self.cenv, self.cfg.bag_cfg
+        cost = bf * cenv.price_food[src.pos] + bw * cenv.price_water[src.pos]
+        room = bag.max_weight - (src.food * bag.food_unit_weight + src.water * bag.water_unit_weight)
+        load = bf * bag.food_unit_weight + bw * bag.water_unit_weight
+        scale = np.ones(len(bf))
+        np.minimum(scale, np.where(cost > src.cash, np.maximum(src.cash, 0.0) / np.maximum(cost, 1e-12), 1.0), out=scale)
+        np.minimum(scale, np.where(load > room, np.maximum(room, 0.0) / np.maximum(load, 1e-12), 1.0), out=scale)
+        return bf * scale, bw * scale
+
+    def actions_for(self, batch: StateBatch) -> Tuple[np.ndarray, ActionBatch]:
+        """
+        为一批状态生成动作，返回 (parent, actions)，parent[i] 为第 i 个动作所属状态的下标。
+        每个状态：停留 + 移动到各邻居（不购买）；在补给点另加
+        - “到站”购买：与每个停留/移动组合，补足今天加上从目标节点到最近补给点/终点途中的消耗；
+          最近的补给点可能在身后，因此另加一行补足到终点的消耗（与前者相同时省略）；
+        - “装满”购买：仅与停留组合，补足剩余全部天数的消耗，受背包与现金限制。
+        两类购买都已扣除现有存量，且与停留/移动同日完成。
+        每个状态至多保留 MAX_PURCHASE_ROWS 个购买动作：目标离终点近者优先，同一目标按 到站/到终点/装满 的顺序。
+        途中天数：forecast=True 时取 CompiledEnvironment.arrival_days 的最早到达天数，
+        计入某天边长超过当日行程上限时的原地等待；否则未来天气未知，取跳数。
+        """
+        tables = [self.move_table(p) for p in batch.pos.tolist()]
+        parent = np.repeat(np.arange(len(batch)), [len(t) for t in tables])
+        moves = ActionBatch.concat(tables)
+        src = batch.take(parent)
+        at_supply = self.cenv.has_supply[src.pos]
+        if not at_supply.any():
+            return parent, moves
+
+        day_idx = np.minimum(src.day - 1, self.cfg.days - 1)
+        target = np.where(moves.next_node >= 0, moves.next_node, src.pos)
+        stay = moves.next_node < 0
+        if self.forecast:
+            # 明天开始时位于 target
+            tomorrow = np.minimum(src.day, self.cfg.days)
+            to_stop = self.cenv.arrival_days("stop")[tomorrow, target]
+            to_end = self.cenv.arrival_days("end")[tomorrow, target]
+        else:
+            to_stop, to_end = self.cenv.days_to_stop[target], self.cenv.days_to_end[target]
+        horizons = (
+            (at_supply, 1 + to_stop),
+            (at_supply, 1 + to_end),
+            (at_supply & stay, self.cfg.days - day_idx),
+        )
+        # 购买动作的保留优先级：目标到终点的天数，同一目标再按 horizons 的顺序
+        priority = to_end.astype(np.int64) * len(horizons)
+        extra, parents, ranks, seen = [], [], [], []
+        for kind, (allowed, horizon) in enumerate(horizons):
+            need_f, need_w = self._need(day_idx, horizon)
+            bf, bw = self._clip_purchase(src, np.maximum(need_f - src.food, 0.0), np.maximum(need_w - src.water, 0.0))
+            mask = allowed & ((bf > 0) | (bw > 0))
+            for pf, pw in seen:
+                mask &= ~(np.isclose(bf, pf) & np.isclose(bw, pw))
+            seen.append((bf, bw))
+            rows = moves.take(np.flatnonzero(mask))
+            rows.buy_food, rows.buy_water = bf[mask], bw[mask]
+            extra.append(rows)
+            parents.append(parent[mask])
+            ranks.append(priority[mask] + kind)
+        buy_parent = np.concatenate(parents)
+        keep = np.flatnonzero(_first_per_group(buy_parent, np.concatenate(ranks), MAX_PURCHASE_ROWS))
+        buys = ActionBatch.concat(extra).take(keep)
+        return np.concatenate([parent, buy_parent[keep]]), ActionBatch.concat([moves, buys])
 
     def neighbors(self, state: State) -> List[Action]:
-        actions: List[Action] = [Action(rest=True)]
-        for nid, _dist in self.env.map_graph.adjacency.get(state.position, []):
-            actions.append(Action(next_node_id=nid))
-        node = self.env.map_graph.nodes.get(state.position)
-        if node and node.supply:
-            for bf in [0, 2, 5]:
-                for bw in [0, 2, 5]:
-                    actions.append(Action(next_node_id=None, buy_food=bf, buy_water=bw, rest=True))
-        return actions
+        batch = StateBatch.from_states([state], self.tables.index)
+        _, actions = self.actions_for(batch)
+        return actions.to_actions(self.tables.node_ids)
+
+    def score(self, batch: StateBatch) -> np.ndarray:
+        """束内排序分数：到终点的最少天数（跳数）越少、cash 与物资越多越好。"""
+        return -self.cenv.days_to_end[batch.pos] + 0.01*batch.cash + 0.005*(batch.food + batch.water)
+
+    def upper_bound(self, batch: StateBatch) -> np.ndarray:
+        """
+        每个状态最终 cash 的乐观上界：现有 cash + 剩余非赶路日的收益上限
+        - 以最低价补足最短到终点天数（按剩余日中最小的单日消耗计）所缺的物资。
+        忽略负重与补给点位置，因此不会低估。
+        """
+        days = self.cfg.days
+        d = np.minimum(batch.day - 1, days)
+        # 第 d 天起剩余各日中的最小单日消耗
+        min_food = np.r_[np.minimum.accumulate(self.cenv.food_cons[::-1])[::-1], 0.0]
+        min_water = np.r_[np.minimum.accumulate(self.cenv.water_cons[::-1])[::-1], 0.0]
+        hops = self.cenv.days_to_end[batch.pos]
+        short_food = np.maximum(hops * min_food[d] - batch.food, 0.0)
+        short_water = np.maximum(hops * min_water[d] - batch.water, 0.0)
+        with np.errstate(invalid="ignore"):
+            cost = np.where(short_food > 0, short_food * self.min_price_food, 0.0)
+            cost += np.where(short_water > 0, short_water * self.min_price_water, 0.0)
+        income = self.income_per_day * np.maximum(days - d - hops, 0)
+        return batch.cash + income - cost
+
+    def prune(self, batch: StateBatch) -> np.ndarray:
+        """
+        同层剪枝，返回保留行的下标（按置换表插入顺序分组，组内按 cash/food/water 降序）：
+        1) 置换表：(day, position, food, water) 四舍五入后相同者只保留 cash 最高的一个（并列取最早）；
+        2) Pareto 支配：同一 (day, position) 下，cash/food/water 均不优于另一状态者丢弃。
+        """
+        m = len(batch)
+        idx = np.arange(m)
+        rf = np.round(batch.food, self.round_digits)
+        rw = np.round(batch.water, self.round_digits)
+        order = np.lexsort((idx, -batch.cash, rw, rf, batch.pos, batch.day))
+        keys = np.stack([batch.day, batch.pos, rf, rw])[:, order]
+        new = np.ones(m, dtype=bool)
+        new[1:] = (keys[:, 1:] != keys[:, :-1]).any(axis=0)
+        starts = np.flatnonzero(new)
+        winners = order[starts]
+        first_seen = np.minimum.reduceat(order, starts)
+        table = winners[np.argsort(first_seen, kind="stable")]
 
-    def score(self, s: State) -> float:
-        end_id = self.env.end_node()
-        dist_heur = 0 if s.position == end_id else 1
-        return -dist_heur + 0.01*s.cash + 0.005*(s.food + s.water)
+        # (day, position) 分组，组序为组内首个表项的位置
+        node_key = batch.day[table].astype(np.int64) * len(self.tables.node_ids) + batch.pos[table]
+        _, first, inverse = np.unique(node_key, return_index=True, return_inverse=True)
+        rank = np.arange(len(table))
+        grouped = table[np.lexsort((rank, -batch.water[table], -batch.food[table], -batch.cash[table], first[inverse]))]
+
+        # 组内支配者必先于被支配者出现；被任一前者支配即被某个保留者支配（传递性）
+        g_key = batch.day[grouped].astype(np.int64) * len(self.tables.node_ids) + batch.pos[grouped]
+        bounds = np.flatnonzero(np.r_[True, g_key[1:] != g_key[:-1], True])
+        dominated = np.zeros(len(grouped), dtype=bool)
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            if b - a < 2:
+                continue
+            g = grouped[a:b]
+            c, f, w = batch.cash[g], batch.food[g], batch.water[g]
+            dom = (c[None, :] >= c[:, None]) & (f[None, :] >= f[:, None]) & (w[None, :] >= w[:, None])
+            dominated[a:b] = np.tril(dom, k=-1).any(axis=1)
+        kept = grouped[~dominated]
+
+        self.layer_stats.append({
+            "generated": m,
+            "duplicates": m - len(table),
+            "dominated": len(table) - len(kept),
+            "kept": len(kept),
+        })
+        return kept
+
+    def expand(self, frontier: Layer) -> Tuple[bool, Optional[State], Optional[Layer]]:
+        """
+        扩展一层（一天）。返回 (finished, result, next_frontier)：
+        frontier 中已有到达终点的状态或无后继时 finished=True，result 即最终结果，next_frontier 为 None。
+        整层的 (state, action) 组合交给 CompiledEnvironment.step_batch 一次推进；
+        保留的后继只记录为数组与父行号（Layer），结果才还原成 State。
+        """
+        batch = frontier.states
+        ends = np.flatnonzero(self.cenv.is_end[batch.pos])
+        if ends.size:
+            return True, self.cenv.materialize(frontier, int(ends[0])), None
+        if not len(frontier):
+            return True, None, None
+        layer = None
+        if self.profile is not None:
+            t0 = time.perf_counter()
+            layer = LayerProfile(day=int(batch.day[0]), expanded=len(frontier))
+            self.profile.layers.append(layer)
+
+        parent, actions = self.actions_for(batch)
+        nxt, ok = self.cenv.step_batch(batch.take(parent), actions,
+                                       rejections=layer.rejections if layer else None)
+        reachable = self.cenv.days_to_end[nxt.pos] <= self.cfg.days - nxt.day + 1
+        if layer:
+            layer.generated = len(actions)
+            layer.rejections[REJECT_CANNOT_FINISH] = int((ok & ~reachable).sum())
+        ok &= reachable
+        if self.incumbent is not None:
+            bound = self.upper_bound(nxt)
+            arrive = nxt.day + self.cenv.days_to_end[nxt.pos]
+            bounded = ok & ((bound < self.incumbent.cash - CASH_EPS)
+                            | ((bound <= self.incumbent.cash + CASH_EPS) & (arrive >= self.incumbent.day)))
+            if layer:
+                layer.rejections[REJECT_BOUND] = int(bounded.sum())
+            ok &= ~bounded
+        sel = np.flatnonzero(ok)
+        if sel.size == 0:
+            if layer:
+                layer.seconds = time.perf_counter() - t0
+            return True, None, None
+
+        cand = nxt.take(sel)
+        kept = self.prune(cand)
+        scores = self.score(cand.take(kept))
+        top = kept[np.argsort(-scores, kind="stable")[:self.beam_width]]
+        self.beam_cut |= len(kept) > len(top)
+        rows = sel[top]
+        next_frontier = Layer(cand.take(top), parent[rows], actions.take(rows),
+                              self.cenv.weather[int(batch.day[0]) - 1], frontier)
+        if layer:
+            stats = self.layer_stats[-1]
+            layer.feasible = stats["generated"]
+            layer.duplicates = stats["duplicates"]
+            layer.dominated = stats["dominated"]
+            layer.kept = len(top)
+            layer.beam_cut = len(kept) - len(top)
+            layer.seconds = time.perf_counter() - t0
+        return False, None, next_frontier
 
     def solve_once(self, init_state: State) -> Optional[State]:
-        frontier = [init_state]
-        best = None
+        self.layer_stats = []
+        if not self.profiling:
+            return self._search(init_state)
+        self.profile = SearchProfile(beam_width=self.beam_width)
+        t0 = time.perf_counter()
+        result = self._search(init_state)
+        self.profile.seconds = time.perf_counter() - t0
+        self.profile.result = "end" if result is not None else "dead"
+        return result
+
+    def _search(self, init_state: State, deadline: Optional[float] = None) -> Optional[State]:
+        """deadline 为 time.perf_counter() 时刻，超过后在层间中断并置 timed_out，返回 None。"""
+        self.timed_out = False
+        self.beam_cut = False
+        frontier = self.cenv.root_layer(init_state)
         for _ in range(self.cfg.days - init_state.day + 1):
-            candidates = []
-            for s in frontier:
-                if self.env.reached_end(s):
-                    return s
-                for a in self.neighbors(s):
-                    ns = self.env.step(s, a)
-                    if ns:
-                        candidates.append(ns)
-            if not candidates:
+            if deadline is not None and time.perf_counter() >= deadline:
+                self.timed_out = True
                 return None
-            candidates.sort(key=self.score, reverse=True)
-            frontier = candidates[:self.beam_width]
-            best = frontier[0]
-        return best if best and self.env.reached_end(best) else None
+            finished, result, frontier = self.expand(frontier)
+            if finished:
+                return result
+        return self.final_result(frontier)
+
+    def final_result(self, frontier: Optional[Layer]) -> Optional[State]:
+        """期限用尽时 frontier 首行若在终点即为结果。"""
+        if frontier is None or not len(frontier) or not self.cenv.is_end[frontier.states.pos[0]]:
+            return None
+        return self.cenv.materialize(frontier, 0)
+
+    def solve_anytime(self, init_state: State, time_budget: float, start_width: int = 8,
+                      growth: float = 2.0, max_width: Optional[int] = None) -> Optional[State]:
+        """
+        限时求解：从 start_width 开始逐轮按 growth 倍加宽束宽重新搜索，保留目前最好的到达终点状态
+        （cash 高者优先，同 cash 取用时少者）。到达 time_budget 秒、束宽超过 max_width，
+        或某轮没有任何层被束宽截断（再加宽结果不变）时停止。超时的那一轮结果丢弃。
+        """
+        deadline = time.perf_counter() + time_budget
+        saved_width = self.beam_width
+        self.anytime_rounds = []
+        best: Optional[State] = None
+        width = max(1, start_width)
+        try:
+            while max_width is None or width <= max_width:
+                self.beam_width = width
+                self.layer_stats = []
+                t0 = time.perf_counter()
+                result = self._search(init_state, deadline=deadline)
+                # 后续轮次带着 incumbent 搜索，只追平它的轮次返回 None，因此记录的是本轮结束时的最优解
+                improved = not self.timed_out and result is not None and _better(result.cash, result.day, best)
+                if improved:
+                    best = result
+                    self.incumbent = best
+                self.anytime_rounds.append({
+                    "beam_width": width, "seconds": time.perf_counter() - t0, "completed": not self.timed_out,
+                    "improved": improved, "cash": best.cash if best else None,
+                })
+                if self.timed_out:
+                    break
+                if not self.beam_cut:
+                    break
+                width = max(width + 1, int(width * growth))
+        finally:
+            self.beam_width = saved_width
+            self.incumbent = None
+        return best
 
     def solve_monte_carlo(self, init_state: State) -> Optional[State]:
-        return self.solve_once(init_state)
\ No newline at end of file
+        return self.solve_once(init_state)
+
+
+class BranchAndBoundSolver(BeamSearchSolver):
+    """
+    分支定界：先用窄束搜索得到一个完整解作为下界，再逐层穷举（不按束宽截断），
+    剪掉 upper_bound 不超过当前最优解的状态；到达终点的状态作为完整解更新最优并停止扩展。
+    只在 BeamSearchSolver 生成的动作（启发式的购买量）之内穷举，不保证等于 DPSolver 的最优解；
+    某层保留状态超过 max_frontier 时退化为按 score 截断（置 beam_cut），超时置 timed_out。
+    """
+
+    def __init__(self, cfg: ProblemConfig, max_frontier: int = 20000, seed_width: int = 8,
+                 tables: Optional[GraphTables] = None, profile: bool = False, forecast: bool = True):
+        super().__init__(cfg, beam_width=max_frontier, tables=tables, profile=profile, forecast=forecast)
+        self.seed_width = seed_width
+
+    def _search(self, init_state: State, deadline: Optional[float] = None) -> Optional[State]:
+        max_frontier, profile = self.beam_width, self.profile
+        self.beam_width, self.profile, self.incumbent = self.seed_width, None, None
+        try:
+            best = super()._search(init_state, deadline=deadline)
+        finally:
+            self.beam_width, self.profile = max_frontier, profile
+        self.layer_stats = []
+        if self.timed_out:
+            return best
+
+        self.incumbent = best
+        self.timed_out = False
+        self.beam_cut = False
+        frontier = self.cenv.root_layer(init_state)
+        try:
+            for _ in range(self.cfg.days - init_state.day + 2):
+                states = frontier.states
+                ends = self.cenv.is_end[states.pos]
+                for i in np.flatnonzero(ends).tolist():
+                    if _better(states.cash[i], states.day[i], best):
+                        best = self.cenv.materialize(frontier, i)
+                        self.incumbent = best
+                alive = frontier.take(np.flatnonzero(~ends))
+                if not len(alive) or alive.states.day[0] > self.cfg.days:
+                    break
+                if deadline is not None and time.perf_counter() >= deadline:
+                    self.timed_out = True
+                    break
+                finished, _, frontier = self.expand(alive)
+                if finished:
+                    break
+        finally:
+            self.incumbent = None
+        return best
+
+
+def _first_per_group(group: np.ndarray, rank: np.ndarray, limit: int) -> np.ndarray:
+    """布尔掩码：每个 group 中 rank 最小的至多 limit 个元素为 True（rank 相同时先出现者优先）。"""
+    order = np.lexsort((np.arange(len(group)), rank, group))
+    g = group[order]
+    starts = np.r_[0, np.flatnonzero(g[1:] != g[:-1]) + 1] if len(g) else np.zeros(0, dtype=np.int64)
+    within = np.arange(len(g)) - np.repeat(starts, np.diff(np.r_[starts, len(g)]))
+    keep = np.zeros(len(group), dtype=bool)
+    keep[order[within < limit]] = True
+    return keep
+
+
+def _running_argmax(A: np.ndarray, axis: int) -> np.ndarray:
+    """沿 axis 原地做前缀最大值，返回每个位置取得该最大值的下标（并列取最后一个）。"""
+    shape = [1] * A.ndim
+    shape[axis] = A.shape[axis]
+    pos = np.arange(A.shape[axis]).reshape(shape)
+    running = np.maximum.accumulate(A, axis=axis)
+    # 前缀最大值在某位置被刷新（A 等于前缀最大值）时记下该位置，再对下标做前缀最大值
+    arg = np.maximum.accumulate(np.where(A >= running, pos, 0), axis=axis)
+    A[...] = running
+    return arg
+
+
+def _grid_step(values: List[float], scale: int = 1000) -> float:
+    """消耗量的最大公约步长，使每日消耗恰为整数格。"""
+    g = 0
+    for v in values:
+        g = math.gcd(g, int(round(v * scale)))
+    return g / scale if g > 0 else 1.0
+
+
+class DPPointers(NamedTuple):
+    """DPSolver 某一天的回溯指针，按当日结束时 (node, food, water) 的格点索引。"""
+    slots: np.ndarray                                   # 0 为停留，j 为 _sources 中第 j 个前驱
+    buys: Dict[int, Tuple[np.ndarray, np.ndarray]]      # 补给点 -> 购买前的 (food, water) 格点
+
+
+class DPSolver:
+    """
+    已知天气下的精确动态规划：状态为 (day, node, food, water)，food/water 按步长离散。
+    值数组 V[node, f, w] 为当日开始时可保留的最大 cash；
+    每日依次做 购买（前缀最大值）→ 移动/停留（邻接取最大）→ 消耗（数组平移），
+    与 Environment.step 的顺序一致。值数组只保留当天的，另存逐日的紧凑回溯指针（DPPointers：
+    来源槽位与补给点的购买前格点）；最优路径沿指针逆向回溯后交由 Environment 重放，
+    因此返回的 State/history 与 BeamSearchSolver 完全同构。
+    """
+
+    def __init__(self, cfg: ProblemConfig, food_step: Optional[float] = None, water_step: Optional[float] = None,
+                 tables: Optional[GraphTables] = None):
+        self.cfg = cfg
+        self.env = Environment(cfg)
+        self.tables = tables or graph_tables_for(cfg)
+        graph = self.env.map_graph
+        self.node_ids: List[str] = self.tables.node_ids
+        self.index: Dict[str, int] = self.tables.index
+        self.end_idx = self.index[self.env.end_node()]
+        self.days_to_end = self.tables.hops_to[self.tables.end_id]
+
+        self.day_costs = [self.env._apply_weather(d) for d in range(cfg.days)]
+        self.food_step = food_step or _grid_step([c[1] for c in self.day_costs])
+        self.water_step = water_step or _grid_step([c[2] for c in self.day_costs])
+        # 消耗向上取整到格点：步长非公约数时结果仍可行（保守）
+        self.food_units = [int(math.ceil(c[1] / self.food_step - 1e-9)) for c in self.day_costs]
+        self.water_units = [int(math.ceil(c[2] / self.water_step - 1e-9)) for c in self.day_costs]
+
+        self.prices: Dict[int, Tuple[float, float]] = {}
+        # 无出售价格时 cash 单调不增，可在无状态能超越已知终点值时提前停止
+        self.cash_monotone = True
+        for nid, node in graph.nodes.items():
+            if node.supply:
+                self.prices[self.index[nid]] = (node.supply.buy_price_food, node.supply.buy_price_water)
+                if node.supply.sell_price_food or node.supply.sell_price_water:
+                    self.cash_monotone = False
+
+    def _sources(self, day_idx: int) -> Dict[int, List[int]]:
+        """当天可走的边，按目标节点分组：{dst: [src, ...]}，终点不作为出发点。"""
+        max_travel = self.day_costs[day_idx][0]
+        sources: Dict[int, List[int]] = {}
+        for src, neigh in self.tables.neighbors.items():
+            si = self.index[src]
+            if si == self.end_idx:
+                continue
+            for dst, dist in neigh:
+                if dist <= max_travel:
+                    sources.setdefault(self.index[dst], []).append(si)
+        return sources
+
+    def _buy(self, V: np.ndarray, f_amt: np.ndarray, w_amt: np.ndarray,
+             overweight: np.ndarray) -> Tuple[np.ndarray, Dict[int, Tuple[np.ndarray, np.ndarray]]]:
+        """
+        原地把 V 改为购买后的值数组 B 并返回，另返回各补给点每个格子取得最大值的购买前格点 (fa, wa)。
+        B[ni, f, w] = max_{a<=f, b<=w} V[ni, a, b] - 买入 (f-a, w-b) 的花费。
+        """
+        B = V
+        choice: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        for ni, (pf, pw) in self.prices.items():
+            bonus = pf * f_amt[:, None] + pw * w_amt[None, :]
+            A = V[ni] + bonus
+            fa = _running_argmax(A, axis=0)
+            wa = _running_argmax(A, axis=1)
+            B[ni] = A - bonus
+            choice[ni] = (np.take_along_axis(fa, wa, axis=1), wa)
+        B[:, overweight] = -np.inf
+        return B, choice
+
+    def _grids(self, f_cap: int, w_cap: int):
+        f_amt = np.arange(f_cap + 1) * self.food_step
+        w_amt = np.arange(w_cap + 1) * self.water_step
+        bag = self.cfg.bag_cfg
+        weight = f_amt[:, None] * bag.food_unit_weight + w_amt[None, :] * bag.water_unit_weight
+        return f_amt, w_amt, weight > bag.max_weight + 1e-9
+
+    def solve_once(self, init_state: State) -> Optional[State]:
+        if self.env.reached_end(init_state):
+            return init_state
+        d0 = init_state.day - 1
+        days = self.cfg.days
+        if d0 >= days:
+            return None
+
+        # 第 d 天开始时有用的资源上限：剩余全部天数的消耗总和
+        f_caps = [sum(self.food_units[d:]) for d in range(d0, days + 1)]
+        w_caps = [sum(self.water_units[d:]) for d in range(d0, days + 1)]
+
+        n = len(self.node_ids)
+        V = np.full((n, f_caps[0] + 1, w_caps[0] + 1), -np.inf)
+        f0 = min(int(math.floor(init_state.food / self.food_step + 1e-9)), f_caps[0])
+        w0 = min(int(math.floor(init_state.water / self.water_step + 1e-9)), w_caps[0])
+        V[self.index[init_state.position], f0, w0] = init_state.cash
+
+        # 只保留逐日的回溯指针（按当日结束时的格点索引），不保留值数组
+        pointers: List[DPPointers] = []
+        best_val, best_k, best_cell = -np.inf, None, (0, 0)
+        for k, d in enumerate(range(d0, days)):
+            f_amt, w_amt, overweight = self._grids(f_caps[k], w_caps[k])
+            B, choice = self._buy(V, f_amt, w_amt, overweight)
+            cf, cw = self.food_units[d], self.water_units[d]
+            M = B.copy()
+            M[self.end_idx] = -np.inf
+            # slots[node] 为取得最大值的来源：0 为停留，j 为 _sources(d, node) 中的第 j 个前驱
+            sources = self._sources(d)
+            slots = np.zeros(M.shape, dtype=np.min_scalar_type(max(map(len, sources.values()), default=0)))
+            for di, srcs in sources.items():
+                for slot, si in enumerate(srcs, start=1):
+                    better = B[si] > M[di]
+                    np.copyto(M[di], B[si], where=better)
+                    slots[di][better] = slot
+            V = M[:, cf:, cw:]
+            # 剩余天数内无法到达终点的节点直接置为不可行
+            V[self.days_to_end > days - d - 1] = -np.inf
+            grid = np.min_scalar_type(max(f_caps[k], w_caps[k]))
+            pointers.append(DPPointers(
+                slots[:, cf:, cw:].copy(),
+                {ni: (fa[cf:, cw:].astype(grid), wa[cf:, cw:].astype(grid)) for ni, (fa, wa) in choice.items()},
+            ))
+            end_vals = V[self.end_idx]
+            end_val = end_vals.max()
+            if end_val > best_val:
+                best_val, best_k = end_val, k + 1
+                best_cell = np.unravel_index(np.argmax(end_vals), end_vals.shape)
+            if self.cash_monotone and best_k is not None:
+                alive = V.max(axis=(1, 2), initial=-np.inf)
+                alive[self.end_idx] = -np.inf
+                if alive.max() <= best_val:
+                    break
+
+        if best_k is None or not np.isfinite(best_val):
+            return None
+        actions = self._recover(pointers, d0, best_k, self.end_idx, int(best_cell[0]), int(best_cell[1]))
+
+        s = init_state
+        for a in actions:
+            s = self.env.step(s, a)
+            if s is None:
+                return None
+        return s
+
+    def _recover(self, pointers: List["DPPointers"], d0: int, k_end: int, node: int, fi: int, wi: int) -> List[Action]:
+        """从终点状态沿逐日回溯指针逆推：移动槽位给出前驱节点，补给点的购买指针给出购买前的格点。"""
+        actions: List[Action] = []
+        for k in range(k_end, 0, -1):
+            d = d0 + k - 1
+            ptr = pointers[k - 1]
+            f1, w1 = fi + self.food_units[d], wi + self.water_units[d]
+            slot = int(ptr.slots[node, fi, wi])
+            si = node if slot == 0 else self._sources(d)[node][slot - 1]
+            if si in ptr.buys:
+                fa, wa = ptr.buys[si]
+                a, b = int(fa[fi, wi]), int(wa[fi, wi])
+            else:
+                a, b = f1, w1
+            actions.append(Action(
+                next_node_id=None if si == node else self.node_ids[node],
+                buy_food=round((f1 - a) * self.food_step, 9),
+                buy_water=round((w1 - b) * self.water_step, 9),
+                rest=si == node
+            ))
+            node, fi, wi = si, a, b
+        actions.reverse()
+        return actions
+
+    def solve_monte_carlo(self, init_state: State) -> Optional[State]:
+        return self.solve_once(init_state)
+
+
+def make_solver(cfg: ProblemConfig, solver: str = "beam", beam_width: int = 40,
+                tables: Optional[GraphTables] = None, profile: bool = False, forecast: bool = True):
+    if solver == "dp":
+        return DPSolver(cfg, tables=tables)
+    if solver == "bnb":
+        return BranchAndBoundSolver(cfg, tables=tables, profile=profile, forecast=forecast)
+    if solver == "beam":
+        return BeamSearchSolver(cfg, beam_width=beam_width, tables=tables, profile=profile, forecast=forecast)
+    raise ValueError(f"Unknown solver: {solver!r}, expected one of {', '.join(SOLVERS)}")
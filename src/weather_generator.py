@@ -1,6 +1,7 @@
-from typing import List, Dict, Literal, Optional
+from typing import List, Dict, Literal, Optional, Tuple
 import numpy as np
 from src.configs import DayCondition
+from src.weather_sim import cumulative_probs, decode_weather
 
 WeatherStr = Literal["Sunny", "Hot", "Sand"]
 
@@ -10,6 +11,25 @@ def _normalize_probs(dist: Dict[WeatherStr, float]) -> Dict[WeatherStr, float]:
         raise ValueError("Probability distribution sums to zero.")
     return {k: v / total for k, v in dist.items()}
 
+def generate_weather_codes_iid(
+    n_samples: int,
+    days: int,
+    seed: int,
+    probs: Dict[WeatherStr, float],
+) -> np.ndarray:
+    """
+    批量独立同分布采样，返回 (n_samples, days) 的 int8 天气编码（见 WEATHER_TYPES）。
+    一次生成整块均匀随机数，按累积分布阈值计数得到类别（等价于 searchsorted side="right"），
+    n_samples=1 时与 rng.choice 结果一致。
+    """
+    order, cdf = cumulative_probs(_normalize_probs(probs))
+    rng = np.random.default_rng(seed)
+    u = rng.random((n_samples, days))
+    idx = np.zeros(u.shape, dtype=np.int8)
+    for c in cdf[:-1]:
+        idx += u >= c
+    return order[idx]
+
 def generate_weather_days_iid(
     days: int,
     seed: int,
@@ -18,11 +38,7 @@ def generate_weather_days_iid(
     """
     独立同分布采样天气序列。
     """
-    probs = _normalize_probs(probs)
-    rng = np.random.default_rng(seed)
-    weathers = list(probs.keys())
-    p = [probs[w] for w in weathers]
-    return list(rng.choice(weathers, size=days, p=p))
+    return decode_weather(generate_weather_codes_iid(1, days, seed, probs)[0])
 
 def to_day_conditions(seq: List[WeatherStr]) -> List[DayCondition]:
     return [
@@ -36,23 +52,23 @@ def to_day_conditions(seq: List[WeatherStr]) -> List[DayCondition]:
         for i, w in enumerate(seq)
     ]
 
-def generate_level_conditions(
-    level: Literal["第三关", "第四关", "第六关"],
-    seed: int = 42,
-) -> List[DayCondition]:
+def level_weather_probs(level: str) -> Tuple[int, Dict[WeatherStr, float]]:
     """
-    按要求生成各关卡天气条件：
+    各关卡的天数与独立同分布天气概率：
     - 第三关：10天，仅晴朗(Sunny)与高温(Hot)，等概率
     - 第四关、第六关：30天，沙暴(Sand)10%，晴朗(Sunny)45%，高温(Hot)45%
     """
     if level == "第三关":
-        days = 10
-        probs = {"Sunny": 0.5, "Hot": 0.5}
-    elif level in ("第四关", "第六关"):
-        days = 30
-        probs = {"Sand": 0.1, "Sunny": 0.45, "Hot": 0.45}
-    else:
-        raise ValueError(f"Unsupported level for generator: {level}")
+        return 10, {"Sunny": 0.5, "Hot": 0.5}
+    if level in ("第四关", "第六关"):
+        return 30, {"Sand": 0.1, "Sunny": 0.45, "Hot": 0.45}
+    raise ValueError(f"Unsupported level for generator: {level}")
 
+def generate_level_conditions(
+    level: Literal["第三关", "第四关", "第六关"],
+    seed: int = 42,
+) -> List[DayCondition]:
+    """按 level_weather_probs 的设定生成关卡天气条件。"""
+    days, probs = level_weather_probs(level)
     seq = generate_weather_days_iid(days=days, seed=seed, probs=probs)
     return to_day_conditions(seq)
@@ -1,6 +1,33 @@
 import numpy as np
-from typing import List, Dict
-from .configs import DayCondition, WeatherType
+from typing import List, Dict, Sequence, Union
+from .configs import DayCondition, WeatherType, WEATHER_TYPES
+
+_CODE = {w: i for i, w in enumerate(WEATHER_TYPES)}
+_NAMES = np.array(WEATHER_TYPES, dtype=object)
+
+def encode_weather(seq: Sequence[WeatherType]) -> np.ndarray:
+    try:
+        return np.array([_CODE[w] for w in seq], dtype=np.int8)
+    except KeyError as e:
+        raise ValueError(f"Unknown weather type: {e.args[0]}") from None
+
+def decode_weather(codes: np.ndarray) -> Union[List[WeatherType], List[List[WeatherType]]]:
+    """整数编码 -> 天气字符串；一维返回单条序列，二维返回序列列表。"""
+    return _NAMES[np.asarray(codes)].tolist()
+
+def codes_to_conditions(codes: np.ndarray) -> List[DayCondition]:
+    return [DayCondition(day=i+1, max_travel_dist=0.0, food_consumption=0.0,
+                         water_consumption=0.0, weather=w)
+            for i, w in enumerate(decode_weather(codes))]
+
+def cumulative_probs(probs: Dict[WeatherType, float]):
+    """返回 (编码顺序, 累积分布)，与 Generator.choice 的 cdf 计算方式一致。"""
+    order = encode_weather(list(probs.keys()))
+    p = np.array(list(probs.values()), dtype=float)
+    p = p / p.sum()
+    cdf = p.cumsum()
+    cdf /= cdf[-1]
+    return order, cdf
 
 class WeatherMonteCarlo:
     def __init__(self, days: int, seed: int = 42,
@@ -18,21 +45,38 @@ class WeatherMonteCarlo:
             "Hot":   {"Sunny": 0.4, "Hot": 0.4,  "Sand": 0.2},
             "Sand":  {"Sunny": 0.3, "Hot": 0.3,  "Sand": 0.4},
         }
+        # 累积转移矩阵：第 k 行为前一日天气编码 k 的 cdf，order 给出列对应的天气编码
+        k = len(WEATHER_TYPES)
+        width = max(len(p) for p in [self.base_probs] + list(self.transition.values()))
+        self.order = np.zeros((k, width), dtype=np.int8)
+        self.cum = np.ones((k, width))
+        for w, code in _CODE.items():
+            order, cdf = cumulative_probs(self.transition.get(w, self.base_probs))
+            self.order[code, :len(order)] = order
+            self.order[code, len(order):] = order[-1]
+            self.cum[code, :len(cdf)] = cdf
+
+    def sample_batch(self, n_samples: int, init_weather: WeatherType = "Sunny") -> np.ndarray:
+        """
+        一次采样 n_samples 条马尔可夫天气序列，返回 (n_samples, days) 的 int8 编码数组。
+        使用一整块均匀随机数，逐日对全部样本做向量化的逆 cdf 查找；
+        与逐条调用 sample_sequence 的随机数流一致。
+        """
+        # 按 (天, 样本) 存放以保证逐日访问连续
+        u = np.ascontiguousarray(self.rng.random((n_samples, self.days - 1)).T)
+        codes = np.empty((self.days, n_samples), dtype=np.int8)
+        codes[0] = _CODE[init_weather]
+        idx = np.empty(n_samples, dtype=np.intp)
+        for t in range(1, self.days):
+            prev = codes[t - 1]
+            idx[:] = 0
+            for j in range(self.cum.shape[1] - 1):
+                idx += self.cum[prev, j] <= u[t - 1]
+            codes[t] = self.order[prev, idx]
+        return np.ascontiguousarray(codes.T)
 
     def sample_sequence(self, init_weather: WeatherType = "Sunny") -> List[WeatherType]:
-        seq = [init_weather]
-        for _ in range(1, self.days):
-            prev = seq[-1]
-            probs = self.transition.get(prev, self.base_probs)
-            weathers = list(probs.keys())
-            p = np.array(list(probs.values()), dtype=float)
-            p = p / p.sum()
-            next_w = self.rng.choice(weathers, p=p)
-            seq.append(next_w)
-        return seq
+        return decode_weather(self.sample_batch(1, init_weather)[0])
 
     def generate_conditions(self, init_weather: WeatherType = "Sunny") -> List[DayCondition]:
-        seq = self.sample_sequence(init_weather)
-        return [DayCondition(day=i+1, max_travel_dist=0.0, food_consumption=0.0,
-                             water_consumption=0.0, weather=w)
-                for i, w in enumerate(seq)]
\ No newline at end of file
+        return codes_to_conditions(self.sample_batch(1, init_weather)[0])